@@ -1,13 +1,24 @@
+import re
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
 
-from data_cleaning.renaming import generate_rename_columns_json
 from data_cleaning.transformations import convert_to_datetime, remove_redundant_decimals
-from data_cleaning.utils import save_json
+
+
+@lru_cache(maxsize=None)
+def _compile_prefix_pattern(prefixes: tuple) -> re.Pattern:
+    """
+    Compiles prefixes into one anchored alternation. Cached since the same prefix lists are reused across calls.
+    """
+    return re.compile("^(?:" + "|".join(map(re.escape, prefixes)) + ")")
 
 
 class BaseCleaner:
     def __init__(self):
-        pass
+        # Arrow backed strings let the str accessor run in Arrow compute kernels
+        self._str_dtype = "string[pyarrow]"
 
     def concat_data(self, df1: pd.DataFrame, df2: pd.DataFrame) -> pd.DataFrame:
         """
@@ -24,9 +35,28 @@ class BaseCleaner:
         pd.DataFrame
             The concatenated DataFrame of df1 and df2.
         """
-        return pd.concat([df1, df2], axis=0, ignore_index=True)
+        return self.concat_many([df1, df2])
 
-    def clean_data(self, df: pd.DataFrame, cols_to_drop: list = []) -> pd.DataFrame:
+    def concat_many(self, frames: list) -> pd.DataFrame:
+        """
+        Function that concatenates any number of DataFrames in a single step.
+        Prefer this over calling `concat_data` in a loop, which copies the accumulated data on every call.
+
+        Parameters
+        ----------
+        frames : list
+            DataFrames (or any iterable of DataFrames) to concatenate.
+
+        Returns
+        -------
+        pd.DataFrame
+            The concatenated DataFrame of all frames.
+        """
+        return pd.concat(list(frames), axis=0, ignore_index=True)
+
+    def clean_data(
+        self, df: pd.DataFrame, cols_to_drop: list = [], subset: list = None
+    ) -> pd.DataFrame:
         """
         A function that cleans a DataFrame by dropping columns, removing duplicates, and converting columns to datetime.
         This function can be used as a inital step in cleaning a DataFrame.
@@ -36,7 +66,10 @@ class BaseCleaner:
         df : pd.DataFrame
             Dataframe to clean.
         cols_to_drop : optional, list
-            Columns to drop from the DataFrame.
+            Columns to drop from the DataFrame. Columns that are not present are ignored.
+        subset : optional, list
+            Columns that identify a row when removing duplicates, e.g. a unique key.
+            Hashing only these columns is much cheaper on wide frames. By default all columns are used.
 
         Returns
         -------
@@ -44,10 +77,8 @@ class BaseCleaner:
             Cleaned DataFrame.
         """
 
-        df = df.copy()
-
-        df = df.drop(columns=cols_to_drop)
-        df = df.drop_duplicates()
+        df = df.drop(columns=cols_to_drop, errors="ignore")
+        df = df.drop_duplicates(subset=subset)
         df = remove_redundant_decimals(df)
         df = convert_to_datetime(df)
 
@@ -73,11 +104,19 @@ class BaseCleaner:
         pd.DataFrame
             The same DataFrame with a new column containing the patient IDs.
         """
-        df = df.copy()
-        df["patient_id"] = df[hosp_id_col].astype(str).map(mapping)
-        df = df.dropna(subset=["patient_id"])
-        df["patient_id"] = df["patient_id"].astype(int)
-        return df
+        # Look all hospital ids up in one hash join instead of a dict lookup per row
+        hosp_ids = pd.Index(list(mapping.keys()))
+        patient_ids = np.asarray(list(mapping.values()), dtype=object)
+
+        positions = hosp_ids.get_indexer(df[hosp_id_col].astype(str))
+        found = positions >= 0
+
+        return (
+            df[found]
+            .assign(patient_id=patient_ids[positions[found]])
+            .dropna(subset=["patient_id"])
+            .astype({"patient_id": int})
+        )
 
     def get_exact_match_mask(self, df: pd.DataFrame, target_cols: list, values: list) -> pd.Series:
         """
@@ -97,7 +136,8 @@ class BaseCleaner:
         pd.Series
             Boolean mask where True indicates a row with an exact match in any of the specified columns.
         """
-        return df[target_cols].apply(lambda col: col.isin(values)).fillna(False).any(axis=1)
+        # isin is already False for missing values, so no fillna is needed
+        return df[target_cols].isin(values).any(axis=1)
 
     def filter_rows_by_exact_value(self, df: pd.DataFrame, target_cols: list, values: list) -> pd.DataFrame:
         """
@@ -118,7 +158,7 @@ class BaseCleaner:
             DataFrame containing only rows where at least one specified column has an exact match with any of the given values.
         """
         row_mask = self.get_exact_match_mask(df, target_cols, values)
-        return df[row_mask].copy()
+        return df[row_mask]
 
     def get_prefix_match_mask(self, df: pd.DataFrame, target_cols: list, prefixes: list) -> pd.Series:
         """
@@ -138,8 +178,25 @@ class BaseCleaner:
         pd.Series
             Boolean mask where True indicates a row with a value that starts with any of the specified prefixes.
         """
-        prefixes_tuple = tuple(prefixes)
-        return df[target_cols].apply(lambda col: col.str.startswith(prefixes_tuple)).fillna(False).any(axis=1)
+        mask = np.zeros(len(df), dtype=bool)
+        if len(prefixes) == 0:
+            return pd.Series(mask, index=df.index)
+
+        # One anchored alternation scans each value once instead of once per prefix
+        pattern = _compile_prefix_pattern(tuple(prefixes))
+        for col in target_cols:
+            col_values = df[col]
+            if isinstance(col_values.dtype, pd.CategoricalDtype):
+                col_values = col_values.astype(object)
+            if col_values.dtype == object and pd.api.types.infer_dtype(col_values, skipna=True) != "string":
+                # Only string values can match, other values such as numbers are not converted to strings
+                col_values = col_values.where(col_values.map(lambda value: isinstance(value, str)))
+            elif not (col_values.dtype == object or isinstance(col_values.dtype, pd.StringDtype)):
+                continue
+            col_values = col_values.astype(self._str_dtype)
+            np.logical_or(mask, col_values.str.match(pattern, na=False).to_numpy(dtype=bool), out=mask)
+
+        return pd.Series(mask, index=df.index)
 
     def filter_rows_by_value_prefix(self, df: pd.DataFrame, target_cols: list, prefixes: list) -> pd.DataFrame:
         """
@@ -160,7 +217,7 @@ class BaseCleaner:
             DataFrame containing only rows where at least one specified column value starts with any of the given prefixes.
         """
         row_mask = self.get_prefix_match_mask(df, target_cols, prefixes)
-        return df[row_mask].copy()
+        return df[row_mask]
     
     def seperate_data_by_prefix(self, df: pd.DataFrame, common_cols:list, prefix:str, keep_prefix = False) -> pd.DataFrame:
         """
@@ -180,19 +237,17 @@ class BaseCleaner:
         pd.DataFrame
             DataFrame containing only the common columns and columns with the specified prefix.
         """
-        df = df.copy()
-
         cols = [col for col in df.columns if col.startswith(prefix)]
 
         df = df[common_cols + cols]
 
         if not keep_prefix:
-            df.columns = [col.replace(prefix, "") for col in df.columns]
+            df.columns = df.columns.str.removeprefix(prefix)
 
         return df, cols
     
     def pivot_data(
-        self, df: pd.DataFrame, index_cols: list, pivot_cols: list, value_col: str
+        self, df: pd.DataFrame, index_cols: list, pivot_cols: str, value_col: str
     ) -> pd.DataFrame:
         """
         Pivot a DataFrame by specified index and pivot columns, expanding rows to ensure each cell contains only one value.
@@ -203,42 +258,44 @@ class BaseCleaner:
             The DataFrame to pivot.
         index_cols : list
             List of column names to use as the index for grouping.
-        pivot_cols : list
-            List of column names to pivot. Unique values in these columns will form individual columns
+        pivot_cols : str
+            Column name to pivot. Unique values in this column will form individual columns
             in the output DataFrame.
         value_col : str
             Column containing values to populate the pivot table. If multiple values exist for the same
-            combination of `index_cols` and `pivot_cols`, they are aggregated into lists.
+            combination of `index_cols` and `pivot_cols`, each value gets its own row.
 
         Returns
         -------
         pd.DataFrame
             A pivoted DataFrame with expanded rows, where each cell contains a single value. For cases with
-            multiple values in the same cell, the values are first aggregated into lists and then expanded
-            across rows.
+            multiple values in the same cell, one row is created for every combination of values across
+            the pivoted columns.
 
         Example
         -------
         >>> df_pivoted = pivot_data(
             df=diagnosis,
             index_cols=["patient_id", "origin", "diagnosis_date"],
-            pivot_cols=["diagnosis_type"],
+            pivot_cols="diagnosis_type",
             value_col="diagnosis_code"
         )
         """
-        df_pivoted = df.pivot_table(
-            index=index_cols,
-            columns=pivot_cols,
-            values=value_col,
-            aggfunc=lambda x: list(x),
-        ).reset_index()
-
-        df_pivoted.columns.name = None
+        # Rows with missing keys are left out, as pivot_table would do
+        df = df.dropna(subset=index_cols + [pivot_cols])
 
-        pivot_columns = [col for col in df[pivot_cols].unique()]
+        df_pivoted = df[index_cols].drop_duplicates().sort_values(index_cols, ignore_index=True)
 
+        # Joining the values of each pivot column onto the keys gives one value per cell
+        # and the same cross product of values as aggregating to lists and exploding
+        pivot_columns = df[pivot_cols].unique()
         for col in pivot_columns:
-            df_pivoted = df_pivoted.explode(col)
+            values = df.loc[df[pivot_cols] == col, index_cols + [value_col]]
+            df_pivoted = df_pivoted.merge(
+                values.rename(columns={value_col: col}), on=index_cols, how="left"
+            )
+
+        df_pivoted = df_pivoted[index_cols + sorted(pivot_columns)]
 
         return df_pivoted
     
@@ -263,46 +320,75 @@ class BaseCleaner:
         -------
         Original DataFrame with an additional column "block_id" indicating overlapping periods.
         """
-        df = df.copy()
         start_date = start + '_date'
         stop_date = stop + '_date'
 
-        df[start_date] = df[start].dt.normalize()
-        df[stop_date] = df[stop].dt.normalize()
+        df = df.assign(
+            **{start_date: df[start].dt.normalize(), stop_date: df[stop].dt.normalize()}
+        )
         df = df.sort_values([patient_id, start_date, stop_date]).reset_index(drop=True)
 
-        prev_max_end = df.groupby(patient_id)[stop_date].cummax().shift()
-        new_block = (df[start_date] > (prev_max_end + pd.Timedelta(days=time))) | prev_max_end.isna()
-        df["block_id"] = new_block.groupby(df[patient_id]).cumsum()
+        if df.empty:
+            df["block_id"] = np.zeros(0, dtype=np.int64)
+            return df
+
+        patient_ids = df[patient_id].to_numpy()
+        start_days = df[start_date].to_numpy(dtype="datetime64[D]")
+        stop_days = df[stop_date].to_numpy(dtype="datetime64[D]")
+        valid_start = ~np.isnat(start_days)
+        valid_stop = ~np.isnat(stop_days)
+
+        first_in_group = np.ones(len(df), dtype=bool)
+        first_in_group[1:] = patient_ids[1:] != patient_ids[:-1]
+        group = np.cumsum(first_in_group) - 1
+
+        # Count days from the earliest stop date, missing stop dates become -1
+        origin = stop_days[valid_stop].min() if valid_stop.any() else np.datetime64(0, "D")
+        rel_start = np.where(valid_start, start_days - origin, np.timedelta64(0, "D")).astype(np.int64)
+        rel_stop = np.where(valid_stop, stop_days - origin, np.timedelta64(-1, "D")).astype(np.int64)
+
+        # Give each patient its own range of values so that one running max over the
+        # whole array never carries a stop date over to the next patient
+        span = rel_stop.max() + 2
+        running_max = np.maximum.accumulate(group * span + rel_stop) - group * span
+
+        # A missing stop date also leaves the running max missing for the next row
+        prev_max_end = np.full(len(df), -1, dtype=np.int64)
+        prev_max_end[1:] = np.where(valid_stop[:-1], running_max[:-1], -1)
+
+        new_block = (
+            first_in_group
+            | (prev_max_end < 0)
+            | (valid_start & (rel_start > prev_max_end + time))
+        )
+        block_count = np.cumsum(new_block)
+        df["block_id"] = block_count - block_count[first_in_group][group] + 1
         return df
     
 
     def calculate_hospitalisation_times(self, df, unique_id, baseline, start, stop, time):
-        df = df.copy()
-        
-        for col in [baseline, start, stop]:
-            df[col] = pd.to_datetime(df[col])
-
-        start_date = start + '_date'
-        stop_date = stop + '_date'
-        df[start_date] = df[start]
-        df[stop_date] = df[stop]
-        df['baseline_date'] = df[baseline]
+        # Columns that already are datetimes do not need to be parsed again
+        baseline_dates, start_dates, stop_dates = (
+            (df[col] if pd.api.types.is_datetime64_any_dtype(df[col]) else pd.to_datetime(df[col]))
+            .to_numpy(dtype="datetime64[ns]")
+            for col in [baseline, start, stop]
+        )
 
-        
-        window_start = df['baseline_date'] + pd.Timedelta(days=1)
-        window_end = df['baseline_date'] + pd.Timedelta(days=time)
+        window_start = baseline_dates + np.timedelta64(1, "D")
+        window_end = baseline_dates + np.timedelta64(time, "D")
 
         # clip dates
-        df['start_date_trunc'] = df[start_date].clip(lower=window_start)
-        df['stop_date_trunc'] = df[stop_date].clip(upper=window_end)
+        start_trunc = np.maximum(start_dates, window_start)
+        stop_trunc = np.minimum(stop_dates, window_end)
+
+        # NaT never compares as smaller or equal, so missing dates are dropped here
+        mask = start_trunc <= stop_trunc
 
         # needed so that one day hospitalisations are counted also
-        df['diff'] = (df['stop_date_trunc'] - df['start_date_trunc']).dt.days + 1
-        
-        
-        df = df[df['start_date_trunc'] <= df['stop_date_trunc']]
-        
+        diff = (stop_trunc[mask] - start_trunc[mask]) // np.timedelta64(1, "D") + 1
+
+        df = pd.DataFrame({unique_id: df[unique_id].to_numpy()[mask], 'diff': diff})
+
         df_hosp_times = df.groupby(unique_id).agg({
             'diff': 'sum'
         }).reset_index().rename(columns={'diff': f'hosp_time_{time}'})
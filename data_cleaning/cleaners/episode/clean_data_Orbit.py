@@ -24,7 +24,7 @@ class OrbitCleaner(EpisodeCleaner):
         pd.DataFrame
             DataFrame containing only major procedures.
         """
-        df = df.copy()
-        major_procedures = df[code_col_name].str[0].between("A", "N")
-        df = df[major_procedures]
-        return df
+        # Slicing and comparing the first character runs in Arrow kernels on string[pyarrow]
+        first_char = df[code_col_name].astype(self._str_dtype).str[0]
+        major_procedures = first_char.between("A", "N").fillna(False)
+        return df[major_procedures]
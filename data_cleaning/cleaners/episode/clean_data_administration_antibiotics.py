@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from data_cleaning.cleaners.episode.episodeCleaner import EpisodeCleaner
 
@@ -24,13 +25,10 @@ class Administraion_antibiotics(EpisodeCleaner):
         pd.DataFrame
             DataFrame containing cleaned antibiotic names.
         """
-        df = df.copy()
-        df[antibiotics_col_name] = df[antibiotics_col_name].str.extract(
+        return df[antibiotics_col_name].astype(self._str_dtype).str.extract(
             r"^([a-zåäöA-ZÅÄÖ/]+)", expand=False
         )
 
-        return df[antibiotics_col_name]
-
     def deduplicate_based_test_type(
         self,
         df: pd.DataFrame,
@@ -56,11 +54,11 @@ class Administraion_antibiotics(EpisodeCleaner):
             A DataFrame with the data deduplicated based on the priority of the test type.
         """
 
-        df = df.copy()
-
-        # Set priority
-        priority_map = {key: value for value, key in enumerate(priority)}
-        df["priority"] = df[test_type_col_name].map(priority_map)
+        # Set priority from the categorical codes, test types not in `priority` come last
+        codes = pd.Categorical(
+            df[test_type_col_name], categories=priority, ordered=True
+        ).codes
+        df = df.assign(priority=np.where(codes == -1, len(priority), codes))
 
         # Deduplicate
         subset_cols = [
@@ -68,10 +66,12 @@ class Administraion_antibiotics(EpisodeCleaner):
             for col in df.columns
             if col not in [test_type_col_name, sir_value_col_name, "priority"]
         ]
-        print(subset_cols)
-        df = df.sort_values(by=["priority"]).drop_duplicates(
-            subset=subset_cols, keep="first"
+        keep = (
+            df.reset_index(drop=True)
+            .groupby(subset_cols, sort=False, dropna=False)["priority"]
+            .idxmin()
         )
+        df = df.iloc[np.sort(keep.to_numpy())]
 
         # Drop priority column and return
         return df.drop(columns=["priority"])
@@ -79,10 +79,15 @@ class Administraion_antibiotics(EpisodeCleaner):
     def split_antibiotic_name(
         self, df: pd.DataFrame, antibiotic_testing_col_name: str
     ) -> pd.DataFrame:
-        
-        df = df.copy()
-        df[["resistance_determination_type", "resistance_determination_antibiotic"]] = (
-            df[antibiotic_testing_col_name].str.split(" ", n=1, expand=True)
+
+        split = (
+            df[antibiotic_testing_col_name]
+            .astype(self._str_dtype)
+            .str.split(" ", n=1, expand=True)
+        )
+        df = df.assign(
+            resistance_determination_type=split[0],
+            resistance_determination_antibiotic=split[1],
         )
         df = df.drop(columns=[antibiotic_testing_col_name])
         return df
@@ -99,19 +104,35 @@ class Administraion_antibiotics(EpisodeCleaner):
         adequate_values: list = ["S", "I"],
         output_col: str = "adequate_antibiotic_usage",
     ):
-        df = df.copy()
-        sir_data = sir_data.copy()
-
-        combined = pd.merge(df, sir_data, how="right", on=merge_on_columns)
+        # Only merge the columns that are used below, the rest would just be copied
+        used_cols = set(merge_on_columns) | {
+            antibiotics_admin_col,
+            resistance_antibiotic_col,
+            episode_id_col,
+            sir_col,
+        }
+        combined = pd.merge(
+            df[[col for col in df.columns if col in used_cols]],
+            sir_data[[col for col in sir_data.columns if col in used_cols]],
+            how="right",
+            on=merge_on_columns,
+            sort=False,
+        )
         combined = combined[
             combined[antibiotics_admin_col] == combined[resistance_antibiotic_col]
         ]
 
-        def determine_adequacy(sir_values):
-            return 1 if any(val in adequate_values for val in sir_values) else 0
-
-        combined[output_col] = combined.groupby(episode_id_col)[sir_col].transform(
-            determine_adequacy
+        # An episode is adequately treated if any of its SIR values is adequate
+        is_adequate = combined[sir_col].isin(adequate_values)
+        combined = combined.assign(
+            **{
+                output_col: is_adequate.groupby(combined[episode_id_col], dropna=False)
+                .transform("any")
+                .astype("int8")
+            }
         )
 
-        return combined[[episode_id_col, output_col]].drop_duplicates()
+        # The output is constant within an episode, so one row per episode is enough
+        return combined.groupby(
+            episode_id_col, sort=False, dropna=False, as_index=False
+        )[output_col].first()
@@ -1,5 +1,6 @@
 from data_cleaning.cleaners.episode.episodeCleaner import EpisodeCleaner
 from data_cleaning.transformations import remove_redundant_decimals
+import numpy as np
 import pandas as pd
 
 class CeilingCleaner(EpisodeCleaner):
@@ -7,31 +8,6 @@ class CeilingCleaner(EpisodeCleaner):
         super().__init__()
 
 
-    def map_ceiling_decision(self, ceiling_decision: str) -> int:
-        """
-        Maps ceiling decision to a numerical value based on keywords. Helper function for filter_and_link_patient_id.
-
-        Parameters
-        ----------
-        ceiling_decision : str
-            Ceiling decision as a string.
-
-        Returns
-        -------
-        int
-            The numerical value of a string ceiling decision.
-        """
-        ceiling_decision = ceiling_decision.lower()
-        if 'pall' in ceiling_decision:
-            return 3
-        elif 'intens' in ceiling_decision:
-            return 2
-        elif 'hlr' in ceiling_decision:
-            return 1
-        else:
-            return None
-
-
     def filter_and_link_patient_id(
             self,
             df_multiple: pd.DataFrame,
@@ -72,22 +48,29 @@ class CeilingCleaner(EpisodeCleaner):
         df['ceiling_date'] = df_multiple[ceiling_date_col_name]
 
         # Link care hosps with patient IDs
-        df_care_data = df_care_data.rename(columns={hosp_id_col_name: 'hosp_id'})
-        df = df.merge(
-            df_care_data[['hosp_id', patient_id_col_name]].drop_duplicates(subset='hosp_id'),
-            how='left',
-            on='hosp_id'
-        ).rename(columns={patient_id_col_name: 'patient_id'})
-
-        # Create new column with ceiling decision numbers based on mapping
-        df['ceiling_decision'] = df['ceiling_decision'].apply(self.map_ceiling_decision)
-
-        # Map the numerical values to the corresponding labels and replace them
-        ceiling_decision_labels = {1: "No CPR", 2: "No CPR or ICU", 3: "Palliative care"}
-        df['ceiling_decision'] = df['ceiling_decision'].map(ceiling_decision_labels)
-        
+        patient_ids = (
+            df_care_data[[hosp_id_col_name, patient_id_col_name]]
+            .drop_duplicates(subset=hosp_id_col_name)
+            .set_index(hosp_id_col_name)
+        )
+        df = df.join(patient_ids, on='hosp_id', validate='m:1').rename(columns={patient_id_col_name: 'patient_id'})
+
+        # Map ceiling decisions to labels based on keywords, the first matching keyword decides the label.
+        # The decisions come from multiple choice data, so only the distinct values are matched
+        codes, decisions = pd.factorize(df['ceiling_decision'].astype(self._str_dtype).str.lower())
+        decisions = pd.Series(decisions, dtype=self._str_dtype)
+        keyword_masks = [
+            decisions.str.contains(keyword, regex=False, na=False).to_numpy(dtype=bool)
+            for keyword in ['pall', 'intens', 'hlr']
+        ]
+        decision_labels = np.append(
+            np.select(keyword_masks, ["Palliative care", "No CPR or ICU", "No CPR"], default=None),
+            None
+        )
+        ceiling_decision_labels = decision_labels[codes]
+
         # Convert to a categorical dtype
-        df['ceiling_decision'] = pd.Categorical(df['ceiling_decision'], categories=["No CPR", "No CPR or ICU", "Palliative care"], ordered=True)
+        df['ceiling_decision'] = pd.Categorical(ceiling_decision_labels, categories=["No CPR", "No CPR or ICU", "Palliative care"], ordered=True)
         
         # Drop rows with NaN values
         df = df.dropna(subset='ceiling_decision', ignore_index=True)
@@ -152,19 +135,23 @@ class CeilingCleaner(EpisodeCleaner):
             patient_id_col_name
         )
 
-        df = pd.concat([df_outpatient_filtered, df_inpatient_filtered])
+        df = pd.concat([df_outpatient_filtered, df_inpatient_filtered], ignore_index=True, sort=False)
 
-        # Keep only the row with the 'worst' ceiling_decision for each hosp_id
-        # Sort by hosp_id, ceiling_date and ceiling_decision according to ascending boolean list 
-        # to have the 'worst' ceiling decision at the top of each group
-        df = df.sort_values(['hosp_id', 'ceiling_date', 'ceiling_decision'], ascending=[True, True, False])
-
-        # Drop duplicates, keeping only the first occurrence within each hosp_id group
-        df = df.drop_duplicates(subset=['hosp_id'], keep="first", ignore_index=True)
+        # Keep only the row with the 'worst' ceiling_decision on the earliest ceiling_date for each hosp_id.
+        # Uses groupby reductions instead of sorting the whole frame
+        earliest_date = df.groupby('hosp_id', dropna=False)['ceiling_date'].transform('min')
+        candidates = df[(df['ceiling_date'] == earliest_date) | earliest_date.isna()]
+        worst = (
+            candidates['ceiling_decision'].cat.codes
+            .groupby(candidates['hosp_id'], dropna=False)
+            .idxmax()
+        )
+        df = df.loc[worst.to_numpy()].reset_index(drop=True)
 
         df = remove_redundant_decimals(df)
 
         # Remove timezone sensitivity from datetimes
-        df[['ceiling_date']] = df[['ceiling_date']].apply(lambda col: col.dt.tz_localize(None))
+        if df['ceiling_date'].dt.tz is not None:
+            df['ceiling_date'] = df['ceiling_date'].dt.tz_localize(None)
 
         return df
\ No newline at end of file
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from data_cleaning.cleaners.episode.episodeCleaner import EpisodeCleaner
 
@@ -13,10 +14,45 @@ class HospitalisationCleaner(EpisodeCleaner):
         hosp_type_col: str = "hosp_type",
         remove_hosp_type: bool = False,
         hosp_type_value: str = "Öppenvård",
+        hosp_start_col: str = "hosp_start",
     ) -> pd.DataFrame:
+        """
+        Cleans the hospitalisation data by removing hospitalisations without a stop time and optionally
+        hospitalisations of a given type.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            DataFrame with hospitalisations.
+        hosp_stop_col : str, optional
+            Name of the column with the stop time of the hospitalisation, by default "hosp_stop".
+        hosp_type_col : str, optional
+            Name of the column with the type of hospitalisation, by default "hosp_type".
+        remove_hosp_type : bool, optional
+            Whether to remove the hospitalisations of type `hosp_type_value`, by default False.
+        hosp_type_value : str, optional
+            The type of hospitalisation to remove, by default "Öppenvård".
+        hosp_start_col : str, optional
+            Name of the column with the start time of the hospitalisation, by default "hosp_start".
+
+        Returns
+        -------
+        pd.DataFrame
+            The cleaned hospitalisation data, with the start and stop times in datetime64[s].
+        """
 
         df = df.dropna(subset=[hosp_stop_col])
 
+        # Second precision is enough for hospitalisation times. Joins that need the same unit on
+        # both sides, such as merge_asof, normalise their keys themselves
+        df = df.astype(
+            {
+                col: "datetime64[s]"
+                for col in [hosp_start_col, hosp_stop_col]
+                if col in df.columns and pd.api.types.is_datetime64_dtype(df[col])
+            }
+        )
+
         if remove_hosp_type:
             df = df[
                 ~df[hosp_type_col].str.contains(hosp_type_value, case=False, na=False)
@@ -24,14 +60,16 @@ class HospitalisationCleaner(EpisodeCleaner):
 
         return df
 
-    def calculate_duration(self, intervals: list) -> float:
+    def calculate_duration(self, lefts: np.ndarray, rights: np.ndarray) -> float:
         """
-        Function used to calculate the duration of a list of intervals. The function merges intervals so that overlapping intervals are not counted multiple times.
+        Function used to calculate the duration of a set of intervals. The function merges intervals so that overlapping intervals are not counted multiple times.
 
         Parameters
         ----------
-        intervals : list
-            List of intervals to calculate the duration of. The elements of the list should be of type pd.Interval.
+        lefts : np.ndarray
+            Start times of the intervals as a datetime64 array.
+        rights : np.ndarray
+            Stop times of the intervals as a datetime64 array, in the same order as `lefts`.
 
         Returns
         -------
@@ -39,22 +77,23 @@ class HospitalisationCleaner(EpisodeCleaner):
             The total duration of the intervals in days.
         """
 
-        intervals = sorted(intervals, key=lambda x: x.left)
-
-        merged_intervals = [intervals[0]]
-        for interval in intervals[1:]:
-            last = merged_intervals[-1]
-            if interval.left > last.right:
-                merged_intervals.append(interval)
-            else:
-                merged_intervals[-1] = pd.Interval(
-                    left=last.left, right=max(last.right, interval.right), closed="both"
-                )
-
-        total_seconds = sum(
-            (interval.right - interval.left).total_seconds() + 1
-            for interval in merged_intervals
-        )
+        if len(lefts) == 0:
+            return 0.0
+
+        order = np.argsort(lefts, kind="stable")
+        lefts = lefts[order]
+        rights = rights[order]
+
+        # An interval starts a new merged interval if it starts after all earlier intervals have stopped
+        running_max = np.maximum.accumulate(rights)
+        new_interval = np.ones(len(lefts), dtype=bool)
+        new_interval[1:] = lefts[1:] > running_max[:-1]
+
+        merged_starts = np.flatnonzero(new_interval)
+        merged_lefts = lefts[merged_starts]
+        merged_rights = np.maximum.reduceat(rights, merged_starts)
+
+        total_seconds = ((merged_rights - merged_lefts) / np.timedelta64(1, "s") + 1).sum()
         return total_seconds / (24 * 60 * 60)
 
     def calculate_hosp_duration_past(
@@ -96,58 +135,54 @@ class HospitalisationCleaner(EpisodeCleaner):
             DataFrame containing the episode ID, date, and the calculated duration of hospital
         """
 
-        df = df.copy()
-        result = []
-
         group_columns = [episode_id_col_name, patient_id_col_name, date_col_name]
-        for group_keys, group in df.groupby(group_columns):
-            episode_id, patient_id, baseline = group_keys
-
-            condition = (group[hosp_start_col_name] < baseline) | (
-                group[hosp_stop_col_name] > baseline - time_before
-            )
-
-            filtered_df = group[condition].copy()
-
-            filtered_df["constrained_start"] = filtered_df[hosp_start_col_name].clip(
-                lower=baseline - time_before
-            )
-            filtered_df["constrained_stop"] = filtered_df[hosp_stop_col_name].clip(
-                upper=baseline
-            )
-
-            filtered_df = filtered_df[
-                filtered_df["constrained_start"] < filtered_df["constrained_stop"]
-            ]
-
-            if filtered_df.empty:
-                result.append(
-                    {
-                        episode_id_col_name: episode_id,
-                        date_col_name: baseline,
-                        output_col_name: 0,
-                    }
-                )
-                continue
-
-            intervals = [
-                pd.Interval(left, right, closed="both")
-                for left, right in zip(
-                    filtered_df["constrained_start"], filtered_df["constrained_stop"]
-                )
-            ]
-
-            total_days = self.calculate_duration(intervals)
-
-            result.append(
-                {
-                    episode_id_col_name: episode_id,
-                    date_col_name: baseline,
-                    output_col_name: total_days,
-                }
-            )
+        grouped = df.groupby(group_columns)
+        groups = grouped.size().reset_index()
+        group_codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+
+        baseline = df[date_col_name].to_numpy()
+        window_start = baseline - time_before
+        hosp_start = df[hosp_start_col_name].to_numpy()
+        hosp_stop = df[hosp_stop_col_name].to_numpy()
+
+        condition = (hosp_start < baseline) | (hosp_stop > window_start)
+
+        constrained_start = np.maximum(hosp_start, window_start)
+        constrained_stop = np.minimum(hosp_stop, baseline)
+
+        # Rows with missing keys have no group and are left out, as in groupby
+        keep = (group_codes >= 0) & condition & (constrained_start < constrained_stop)
+
+        # Sort the remaining intervals by group and start so all groups can be merged in one sweep
+        order = np.lexsort((constrained_start[keep], group_codes[keep]))
+        codes = group_codes[keep][order]
+        lefts = constrained_start[keep][order]
+        rights = constrained_stop[keep][order]
+
+        # Within a group, an interval starts a new merged interval if it starts after all
+        # earlier intervals have stopped
+        running_max = pd.Series(rights).groupby(codes).cummax().to_numpy()
+        new_interval = np.ones(len(codes), dtype=bool)
+        new_interval[1:] = (codes[1:] != codes[:-1]) | (lefts[1:] > running_max[:-1])
+
+        merged_starts = np.flatnonzero(new_interval)
+        merged_seconds = np.zeros(0)
+        if len(merged_starts) > 0:
+            merged_rights = np.maximum.reduceat(rights, merged_starts)
+            merged_seconds = (merged_rights - lefts[merged_starts]) / np.timedelta64(1, "s") + 1
+
+        # Groups without any intervals get a duration of 0
+        total_seconds = np.bincount(
+            codes[merged_starts], weights=merged_seconds, minlength=len(groups)
+        )
 
-        return pd.DataFrame(result)
+        return pd.DataFrame(
+            {
+                episode_id_col_name: groups[episode_id_col_name],
+                date_col_name: groups[date_col_name],
+                output_col_name: total_seconds / (24 * 60 * 60),
+            }
+        )
 
     def calculate_hosp_duration_future(
         self,
@@ -164,6 +199,13 @@ class HospitalisationCleaner(EpisodeCleaner):
 
         pass
 
+    def _contains_any(self, hosp_site: pd.Series, sites: list) -> np.ndarray:
+        # Case-insensitive literal match against any of the sites, hosp_site is expected to be lowercased
+        mask = np.zeros(len(hosp_site), dtype=bool)
+        for site in sites:
+            mask |= hosp_site.str.contains(site.lower(), regex=False, na=False).to_numpy(dtype=bool)
+        return mask
+
     def get_most_recent_hospitalisation_data(
         self,
         df,
@@ -174,27 +216,25 @@ class HospitalisationCleaner(EpisodeCleaner):
         exclude_hosp_site: list = [],
         include_only_hosp_site: list = [],
     ):
-        df = df.copy()
-        df_original = df.copy()
+        df_original = df
+
+        if len(exclude_hosp_site) != 0 or len(include_only_hosp_site) != 0:
+            hosp_site = df[hosp_site_col_name].astype(self._str_dtype).str.lower()
 
         if len(exclude_hosp_site) != 0:
-            condition = ~df[hosp_site_col_name].str.contains(
-                "|".join(exclude_hosp_site), case=False, na=False
-            )
+            condition = ~self._contains_any(hosp_site, exclude_hosp_site)
             df = df[condition]
+            hosp_site = hosp_site[condition]
 
         if len(include_only_hosp_site) != 0:
-            condition = df[hosp_site_col_name].str.contains(
-                "|".join(include_only_hosp_site), case=False, na=False
-            )
+            condition = self._contains_any(hosp_site, include_only_hosp_site)
             df = df[condition]
 
-        df["earliest_hosp_start"] = df.groupby(episode_id_col_name)[
-            hosp_start_col_name
-        ].transform("min")
-        df["latest_hosp_stop"] = df.groupby(episode_id_col_name)[
-            hosp_stop_col_name
-        ].transform("max")
+        bounds = df.groupby(episode_id_col_name, sort=False).agg(
+            earliest_hosp_start=(hosp_start_col_name, "min"),
+            latest_hosp_stop=(hosp_stop_col_name, "max"),
+        )
+        df = df.join(bounds, on=episode_id_col_name)
 
         df = df[df[hosp_stop_col_name] == df["latest_hosp_stop"]]
         df = df.merge(
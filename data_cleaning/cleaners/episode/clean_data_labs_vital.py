@@ -1,76 +1,65 @@
+import re
+
+import numpy as np
 import pandas as pd
 from data_cleaning.cleaners.episode.episodeCleaner import EpisodeCleaner
 
 
 class LabVitalsCleaner(EpisodeCleaner):
+    _HAS_DIGIT = re.compile(r"\d")
+    # The replace patterns are kept as plain strings, str.replace falls back to Python for compiled patterns on Arrow strings
+    _NON_NUMERIC = r"[^\d,\.]"
+    _EDGE_COMMAS = r"^,+|,+$"
+
     def __init__(self):
         super().__init__()
 
     def clean_measurement(self, df: pd.DataFrame, col_name: str) -> pd.DataFrame:
-        df = df.copy()
+        measurement = df[col_name].astype(self._str_dtype)
 
         # Only keep rows that contains atleast one digit
-        condition = df[col_name].str.contains(r"\d", na=False)
+        condition = measurement.str.contains(self._HAS_DIGIT, na=False)
         df = df[condition]
 
-        new_col = col_name + "_cleaned"
         # remove all characters that are not digits, comma or dot.
-        df[new_col] = df[col_name].str.replace(r"[^\d,\.]", "", regex=True)
+        cleaned = measurement[condition].str.replace(self._NON_NUMERIC, "", regex=True)
 
         # if value starts or ends with a comma, then remove it.
-        df[new_col] = df[new_col].str.replace(r"^,+|,+$", "", regex=True)
+        # The three passes are not fused into one, trimming dots at the edges as well would turn '.5' into 5
+        cleaned = cleaned.str.replace(self._EDGE_COMMAS, "", regex=True)
 
         # fix repetitive numbers
-        # df[new_col] = df[new_col].str.replace(r'^(\d+)\1', r'\1', regex=True)
+        # cleaned = cleaned.str.replace(r'^(\d+)\1', r'\1', regex=True)
 
         # replace ',' with '.'
-        # df['vital_result_cleaned'] = df['vital_result_cleaned'].str.replace(r'(\d+),(\d+)', r'\1.\2', regex=True)
-        df[new_col] = df[new_col].str.replace(r",", r".", regex=True)
+        cleaned = cleaned.str.replace(",", ".", regex=False)
 
         # convert to numeric
-        df[new_col] = pd.to_numeric(df[new_col], errors="coerce")
-
-        return df
+        cleaned = pd.to_numeric(cleaned, errors="coerce").astype("float64")
+        return df.assign(**{col_name + "_cleaned": cleaned})
 
     def calculate_reasonability_vitals(
         self, df: pd.DataFrame, result_column: str, vital_name: str, ranges: dict = {}
     ) -> pd.DataFrame:
-        df = df.copy()
-
-        df["reasonable"] = None
+        # Values of vitals without a range are considered reasonable
+        reasonable = np.ones(len(df), dtype=bool)
 
         for vital, (low, high) in ranges.items():
-            mask = df[vital_name] == vital
-            df.loc[
-                mask & (df[result_column].between(low, high, inclusive="both")),
-                "reasonable",
-            ] = True
-            df.loc[
-                mask & ~df[result_column].between(low, high, inclusive="both"),
-                "reasonable",
-            ] = False
+            mask = (df[vital_name] == vital).to_numpy()
+            in_range = df[result_column].between(low, high, inclusive="both").to_numpy()
+            reasonable[mask] = in_range[mask]
 
-        df["reasonable"] = df["reasonable"].fillna(True)
-
-        return df
+        return df.assign(reasonable=reasonable)
 
     def calculate_reasonability_lab(
         self, df: pd.DataFrame, result_column: str, lab_name: str, ranges: dict = {}
     ) -> pd.DataFrame:
-
-        df["reasonable"] = None
+        # Values of labs without a range are considered reasonable
+        reasonable = np.ones(len(df), dtype=bool)
 
         for lab, (low, high) in ranges.items():
-            mask = df[lab_name] == lab
-            df.loc[
-                mask & (df[result_column].between(low, high, inclusive="both")),
-                "reasonable",
-            ] = True
-            df.loc[
-                mask & ~df[result_column].between(low, high, inclusive="both"),
-                "reasonable",
-            ] = False
-
-        df["reasonable"] = df["reasonable"].fillna(True)
-
-        return df
+            mask = (df[lab_name] == lab).to_numpy()
+            in_range = df[result_column].between(low, high, inclusive="both").to_numpy()
+            reasonable[mask] = in_range[mask]
+
+        return df.assign(reasonable=reasonable)
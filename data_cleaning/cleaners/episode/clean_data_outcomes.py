@@ -35,16 +35,12 @@ class OutcomesCleaner(EpisodeCleaner):
         pd.DataFrame
             DataFrame containing mortality data.
         """
-        reference_df = reference_df.copy()
-        microbiology_df = microbiology_df.copy()
-        deceased_df = deceased_df.copy()
-
         # Get the latest hosp dates for each patient_id
         reference_df = reference_df.sort_values(['patient_id', 'hosp_start'], ascending=[True, False])[['patient_id', 'hosp_start', 'hosp_stop']]
         reference_df = reference_df.drop_duplicates(subset=['patient_id']).dropna(subset=['hosp_start'])
 
         # Merge the deceased data with the latest hosp dates
-        deceased_latest_hosp = deceased_df.merge(reference_df, how='left', on='patient_id')
+        deceased_latest_hosp = deceased_df.merge(reference_df, how='left', on='patient_id', validate='m:1')
         deceased_latest_hosp = deceased_latest_hosp.rename(
             columns={'hosp_start': 'latest_in_date', 'hosp_stop': 'latest_out_date'}
         )
@@ -54,24 +50,27 @@ class OutcomesCleaner(EpisodeCleaner):
         # Merge the deceased data with episode IDs and sample dates from the microbiology dataframe
         deceased_episodes = deceased_latest_hosp.merge(microbiology_df[['patient_id', 'episode_id', 'sample_date']], how='left', on='patient_id')
 
+        deceased = deceased_episodes['deceased']
+        deceased_date = deceased_episodes['deceased_date'].to_numpy('datetime64[ns]')
+        mortality_limit = deceased_episodes['sample_date'].to_numpy('datetime64[ns]') + mortality_time.to_timedelta64()
+
         # Condition 1: If `deceased` is False, mortality is False
-        cond1 = deceased_episodes['deceased'] == False
+        cond1 = (deceased == False).fillna(False).to_numpy(dtype=bool)
 
         # Condition 2: If both `latest_in_date` and `deceased` are NaN, set to NaN
-        cond2 = deceased_episodes['latest_in_date'].isna() & deceased_episodes['deceased'].isna()
+        cond2 = deceased_episodes['latest_in_date'].isna().to_numpy() & deceased.isna().to_numpy()
 
         # Condition 3: If `deceased_date` is within mortality_time of `sample_date`, set to True
-        cond3 = deceased_episodes['deceased_date'] <= deceased_episodes['sample_date'] + mortality_time
+        cond3 = deceased_date <= mortality_limit
 
         # Condition 4: If `deceased_date` is NaN and `latest_out_date` is not mortality_time after `sample_date`, set to NaN
-        cond4 = deceased_episodes['deceased_date'].isna() & ~(deceased_episodes['latest_out_date'] > deceased_episodes['sample_date'] + mortality_time)
+        cond4 = np.isnat(deceased_date) & ~(deceased_episodes['latest_out_date'].to_numpy('datetime64[ns]') > mortality_limit)
 
-        # Default to False for all other cases
-        deceased_episodes[mortality_column_name] = np.select(
-            [cond1, cond2, cond3, cond4],
-            [False, None, True, None],
-            default=False
-        )
+        # The first matching condition decides, default to False for all other cases
+        undecided = ~cond1 & ~cond2
+        is_true = undecided & cond3
+        is_na = ~cond1 & (cond2 | (undecided & ~cond3 & cond4))
+        deceased_episodes[mortality_column_name] = pd.arrays.BooleanArray(is_true, is_na)
         
         return deceased_episodes.drop(columns=['latest_in_date', 'latest_out_date'])
     
@@ -93,35 +92,39 @@ class OutcomesCleaner(EpisodeCleaner):
         pd.DataFrame
             DataFrame with readmittance and time to readmittance added.
         """
-        df = df.copy()
-        hospitalisations_df = hospitalisations_df.copy()
-
-        # Merge episode and hospitalisation data
-        merged = df.merge(hospitalisations_df, on='patient_id', how='left')
-
-        # Determine readmitted status
-        merged['readmitted'] = merged['in_date'] > merged[date_limit_col_name]
-
-        # Identify the first readmission date for each episode
-        merged_readmitted = (
-            merged.query('readmitted == True')
-            .sort_values(['episode_id', 'in_date'])
-            .drop_duplicates(subset=['episode_id'])
-            .rename(columns={'in_date': 'first_in_date'})
+        # Find the first hospitalisation after the date limit for each row, without fanning out
+        # to every hospitalisation of the patient
+        # merge_asof requires the same datetime unit and patient id dtype on both sides
+        episodes = df[['episode_id', 'patient_id', date_limit_col_name]].dropna(subset=['patient_id', date_limit_col_name])
+        episodes = episodes.astype({date_limit_col_name: 'datetime64[ns]'})
+        in_dates = hospitalisations_df[['patient_id', 'in_date']].dropna(subset=['patient_id', 'in_date'])
+        in_dates = in_dates.astype({'in_date': 'datetime64[ns]'})
+        if episodes['patient_id'].dtype != in_dates['patient_id'].dtype:
+            both_numeric = all(pd.api.types.is_numeric_dtype(ids) for ids in [episodes['patient_id'], in_dates['patient_id']])
+            patient_id_dtype = 'float64' if both_numeric else object
+            episodes = episodes.astype({'patient_id': patient_id_dtype})
+            in_dates = in_dates.astype({'patient_id': patient_id_dtype})
+        first_readmissions = pd.merge_asof(
+            episodes.sort_values(date_limit_col_name),
+            in_dates.sort_values('in_date').rename(columns={'in_date': 'first_in_date'}),
+            left_on=date_limit_col_name,
+            right_on='first_in_date',
+            by='patient_id',
+            direction='forward',
+            allow_exact_matches=False
         )
 
-        # Aggregate readmitted status by episode_id
-        readmitted = merged.groupby('episode_id')['readmitted'].any().reset_index()
-
-        # Merge first readmission date back into the readmitted DataFrame
-        readmitted = readmitted.merge(
-            merged_readmitted[['episode_id', 'first_in_date']],
-            how='left',
-            on='episode_id'
+        # Aggregate readmitted status and first readmission date by episode_id
+        readmitted = (
+            first_readmissions.assign(readmitted=first_readmissions['first_in_date'].notna())
+            .groupby('episode_id')
+            .agg(readmitted=('readmitted', 'any'), first_in_date=('first_in_date', 'min'))
+            .reindex(pd.Index(df['episode_id'].dropna().unique(), name='episode_id'))
         )
+        readmitted = readmitted.assign(readmitted=readmitted['readmitted'].eq(True)).reset_index()
 
         # Merge readmittance info back to the original DataFrame
-        df = df.merge(readmitted, on='episode_id', how='left')
+        df = df.merge(readmitted, on='episode_id', how='left', validate='m:1')
 
         # Calculate time to readmittance in days
         df['time_to_readmittance'] = (df['first_in_date'] - df[date_limit_col_name]).dt.days
@@ -146,9 +149,8 @@ class OutcomesCleaner(EpisodeCleaner):
         pd.DataFrame
             DataFrame with episode IDs and days of care.
         """
-        hospitalisations = hospitalisations.copy()
-        microbiology = microbiology.copy()
-        
+        time_after_baseline = pd.Timedelta(days=days_after_baseline)
+
         # Adds episode_id to hospitalisations and removes rows where sample_date is after out_date
         hospitalisations = hospitalisations.dropna(subset=['in_date', 'out_date']
                                                 ).merge(microbiology[['patient_id', 'episode_id','sample_date']], how='left', on='patient_id')
@@ -156,33 +158,36 @@ class OutcomesCleaner(EpisodeCleaner):
                                             ].sort_values(['episode_id', 'in_date', 'out_date']
                                                         ).drop(columns='patient_id')
         
-        hospitalisations['previous_in_date'] = hospitalisations.groupby('episode_id')['in_date'].shift(1)
-        hospitalisations['previous_out_date'] = hospitalisations.groupby('episode_id')['out_date'].shift(1)
+        previous = hospitalisations.groupby('episode_id', sort=False)[['in_date', 'out_date']].shift(1)
+        hospitalisations['previous_in_date'] = previous['in_date']
+        hospitalisations['previous_out_date'] = previous['out_date']
 
         # Calculates the first out date for each episode
         first_out_dates = hospitalisations.drop_duplicates(subset=['episode_id']
                                                                     ).rename(columns={'out_date': 'first_out_date'}
                                                                             )[['episode_id', 'first_out_date']]
-        hospitalisations = hospitalisations.merge(first_out_dates, how='left', on='episode_id')
+        hospitalisations = hospitalisations.merge(first_out_dates, how='left', on='episode_id', validate='m:1')
 
         # Removes first care occasion
         hospitalisations = hospitalisations[hospitalisations['episode_id'].duplicated()]
 
         # Removes care occasions with in_dates 365 days after first_out_date
-        hospitalisations['date_limit'] = hospitalisations['first_out_date'] + pd.Timedelta(days=days_after_baseline)
-        hospitalisations = hospitalisations[
-            hospitalisations['in_date'] < hospitalisations['date_limit']
+        date_limit = hospitalisations['first_out_date'] + time_after_baseline
+        hospitalisations = hospitalisations.assign(date_limit=date_limit)[
+            hospitalisations['in_date'] < date_limit
         ]
 
         # Sets out_date to first_out_date + 365 days, if out_date is after this date.
-        hospitalisations['out_date'] = np.minimum(hospitalisations['out_date'], hospitalisations['date_limit'])
-
         # Counts total days and days overlapping with the previous hospitalisation
-        hospitalisations['total_days'] = (hospitalisations['out_date'] - hospitalisations['in_date']).dt.days + 1
-        hospitalisations['overlapping_days'] = np.maximum(0, (hospitalisations['previous_out_date'] - hospitalisations['in_date']).dt.days + 1)
+        hospitalisations = hospitalisations.assign(
+            out_date=np.minimum(hospitalisations['out_date'], hospitalisations['date_limit'])
+        ).assign(
+            total_days=lambda d: (d['out_date'] - d['in_date']).dt.days + 1,
+            overlapping_days=lambda d: np.maximum(0, (d['previous_out_date'] - d['in_date']).dt.days + 1),
+        )
 
-        # Sets overlapping_days to 0 for the first occurrence of each episode_id
-        hospitalisations.loc[hospitalisations.groupby('episode_id').cumcount() == 0, 'overlapping_days'] = 0
+        # Sets overlapping_days to 0 for the first occurrence of each episode_id, rows are sorted by episode_id
+        hospitalisations.loc[~hospitalisations['episode_id'].duplicated(), 'overlapping_days'] = 0
 
         # Calculates the correct days of care for each hospitalisation, taking overlapping days into consideration
         hospitalisations[f'days_of_care_{days_after_baseline}_days_after_baseline'] = hospitalisations['total_days'] - hospitalisations['overlapping_days']
@@ -210,8 +215,7 @@ class OutcomesCleaner(EpisodeCleaner):
         pd.DataFrame
             DataFrame with episode IDs and days of care.
         """
-        hospitalisations = hospitalisations.copy()
-        microbiology = microbiology.copy()
+        time_before_baseline = pd.Timedelta(days=days_before_baseline)
 
         # Adds episode_id to hospitalisations and removes rows where sample_date is before out_date
         hospitalisations = hospitalisations.dropna(subset=['in_date', 'out_date']
@@ -222,18 +226,21 @@ class OutcomesCleaner(EpisodeCleaner):
         
         # Remove rows where in_date is earlier than 365 days before sample_date
         hospitalisations = hospitalisations[
-                hospitalisations['in_date'] > hospitalisations['sample_date'] - pd.Timedelta(days=days_before_baseline)
+                hospitalisations['in_date'] > hospitalisations['sample_date'] - time_before_baseline
             ]
-        
-        hospitalisations['previous_in_date'] = hospitalisations.groupby('episode_id')['in_date'].shift(1)
-        hospitalisations['previous_out_date'] = hospitalisations.groupby('episode_id')['out_date'].shift(1)
 
         # Counts total days and days overlapping with the previous hospitalisation
-        hospitalisations['total_days'] = (hospitalisations['out_date'] - hospitalisations['in_date']).dt.days + 1
-        hospitalisations['overlapping_days'] = np.maximum(0, (hospitalisations['previous_out_date'] - hospitalisations['in_date']).dt.days + 1)
+        previous = hospitalisations.groupby('episode_id', sort=False)[['in_date', 'out_date']].shift(1)
+        hospitalisations = hospitalisations.assign(
+            previous_in_date=previous['in_date'],
+            previous_out_date=previous['out_date'],
+        ).assign(
+            total_days=lambda d: (d['out_date'] - d['in_date']).dt.days + 1,
+            overlapping_days=lambda d: np.maximum(0, (d['previous_out_date'] - d['in_date']).dt.days + 1),
+        )
 
-        # Sets overlapping_days to 0 for the first occurrence of each episode_id
-        hospitalisations.loc[hospitalisations.groupby('episode_id').cumcount() == 0, 'overlapping_days'] = 0
+        # Sets overlapping_days to 0 for the first occurrence of each episode_id, rows are sorted by episode_id
+        hospitalisations.loc[~hospitalisations['episode_id'].duplicated(), 'overlapping_days'] = 0
 
         # Calculates the correct days of care for each hospitalisation, taking overlapping days into consideration
         hospitalisations[f'days_of_care_{days_before_baseline}_days_before_baseline'] = hospitalisations['total_days'] - hospitalisations['overlapping_days']
@@ -1,10 +1,13 @@
+from typing import Callable
+
 from data_cleaning.cleaners.baseCleaner import BaseCleaner
+import numpy as np
 import pandas as pd
 
 
 class EpisodeCleaner(BaseCleaner):
     def __init__(self):
-        pass
+        super().__init__()
 
     def deduplication_based_on_time_diff(
         self, df: pd.DataFrame, diff_col_name: str, groupby_cols: list
@@ -27,12 +30,67 @@ class EpisodeCleaner(BaseCleaner):
         pd.DataFrame
             A deduplicated DataFrame based on the diff times.
         """
-        df = df.copy()
-        df_grouped = df.dropna(subset=[diff_col_name]).loc[
-            df.groupby(groupby_cols)[diff_col_name].idxmax()
-        ]
+        has_diff = df[diff_col_name].notna()
+
+        # Keep the first row with the largest diff in each group, rows with missing group keys are dropped as in groupby
+        df_grouped = (
+            df[has_diff]
+            .dropna(subset=groupby_cols)
+            .sort_values(diff_col_name, ascending=False, kind="stable")
+            .drop_duplicates(subset=groupby_cols, keep="first")
+        )
+
+        return pd.concat([df_grouped, df[~has_diff]], ignore_index=True)
+
+    def _get_row_dates(
+        self, df: pd.DataFrame, date_col_name: str, patient_id_col_name: str
+    ) -> pd.DataFrame:
+        # Narrow frame with the join key, the date and the row position of each row in df
+        return pd.DataFrame(
+            {
+                patient_id_col_name: df[patient_id_col_name].to_numpy(),
+                "date": df[date_col_name].to_numpy(),
+                "row": np.arange(len(df)),
+            }
+        )
+
+    def _join_matched_rows(
+        self,
+        reference_df: pd.DataFrame,
+        df: pd.DataFrame,
+        pairs: pd.DataFrame,
+        patient_id_col_name: str,
+        suffixes: tuple = ("_x", "_y"),
+    ) -> pd.DataFrame:
+        # Left join of reference_df with the matched rows of df given as row position pairs.
+        # Reference rows without a match are kept once with missing values for the columns of df.
+        # Overlapping columns get suffixes like in pd.merge so that the column names stay unique
+        unmatched = np.setdiff1d(
+            np.arange(len(reference_df)), pairs["reference_row"].to_numpy()
+        )
+        reference_rows = np.concatenate([pairs["reference_row"].to_numpy(), unmatched])
+        rows = np.concatenate([pairs["row"].to_numpy(), np.full(len(unmatched), -1)])
 
-        return pd.concat([df_grouped, df[df[diff_col_name].isna()]], ignore_index=True)
+        order = np.argsort(reference_rows, kind="stable")
+        reference_rows = reference_rows[order]
+        rows = rows[order]
+
+        data = df.drop(columns=[patient_id_col_name]).reset_index(drop=True)
+        overlap = reference_df.columns.intersection(data.columns)
+        reference_df = reference_df.rename(columns={col: f"{col}{suffixes[0]}" for col in overlap})
+        data = data.rename(columns={col: f"{col}{suffixes[1]}" for col in overlap})
+        if (rows == -1).any():
+            data = data.reindex(rows)
+        else:
+            data = data.iloc[rows]
+
+        return pd.concat(
+            [
+                reference_df.iloc[reference_rows].reset_index(drop=True),
+                data.reset_index(drop=True),
+            ],
+            axis=1,
+        )
 
     def map_data_to_hospitalisation(
         self,
@@ -77,19 +135,29 @@ class EpisodeCleaner(BaseCleaner):
                             date_col_name="administration_date")
         """
 
-        df = df.copy()
-        reference_df = reference_df.copy()
-
-        df = pd.merge(reference_df, df.copy(), on=patient_id_col_name, how="left")
-
-        df = df[df[hosp_start_col_name].notnull() & df[hosp_end_col_name].notnull()]
-
-        df = df[
-            (df[date_col_name] >= df[hosp_start_col_name])
-            & (df[date_col_name] <= df[hosp_end_col_name])
+        # Join on narrow frames holding only the keys and row positions, so the
+        # patient_id fan-out does not copy every column of both frames
+        hospitalisations = pd.DataFrame(
+            {
+                patient_id_col_name: reference_df[patient_id_col_name].to_numpy(),
+                "start": reference_df[hosp_start_col_name].to_numpy(),
+                "stop": reference_df[hosp_end_col_name].to_numpy(),
+                "reference_row": np.arange(len(reference_df)),
+            }
+        )
+        pairs = hospitalisations.merge(
+            self._get_row_dates(df, date_col_name, patient_id_col_name),
+            on=patient_id_col_name,
+            how="inner",
+            sort=False,
+        )
+        date = pairs["date"].to_numpy("datetime64[ns]")
+        pairs = pairs[
+            (date >= pairs["start"].to_numpy("datetime64[ns]"))
+            & (date <= pairs["stop"].to_numpy("datetime64[ns]"))
         ]
 
-        return pd.merge(reference_df, df, on=reference_df.columns.to_list(), how="left")
+        return self._join_matched_rows(reference_df, df, pairs, patient_id_col_name)
 
     def map_data_to_interval(
         self,
@@ -127,24 +195,39 @@ class EpisodeCleaner(BaseCleaner):
             A DataFrame containing the data mapped to the intervals around the baseline
         """
 
-        df = df.copy()
-        reference_df = reference_df.copy()
-
-        df = pd.merge(reference_df, df, on=patient_id_col_name, how="left")
-
-        df = df[
-            (df[date_col_name] >= df[baseline_col_name] - time_before_baseline)
-            & (df[date_col_name] <= df[baseline_col_name] + time_after_baseline)
+        baselines = pd.DataFrame(
+            {
+                patient_id_col_name: reference_df[patient_id_col_name].to_numpy(),
+                "baseline": reference_df[baseline_col_name].to_numpy(),
+                "reference_row": np.arange(len(reference_df)),
+            }
+        )
+        pairs = baselines.merge(
+            self._get_row_dates(df, date_col_name, patient_id_col_name),
+            on=patient_id_col_name,
+            how="inner",
+            sort=False,
+        )
+        date = pairs["date"].to_numpy("datetime64[ns]")
+        baseline = pairs["baseline"].to_numpy("datetime64[ns]")
+        pairs = pairs[
+            (date >= baseline - pd.Timedelta(time_before_baseline).to_timedelta64())
+            & (date <= baseline + pd.Timedelta(time_after_baseline).to_timedelta64())
         ]
-        df['diff'] = abs(df[date_col_name] - df[baseline_col_name])
 
-        return pd.merge(reference_df, df, on=reference_df.columns.to_list(), how="left")
+        df = self._join_matched_rows(reference_df, df, pairs, patient_id_col_name)
+        df["diff"] = np.abs(
+            df[date_col_name].to_numpy("datetime64[ns]")
+            - df[baseline_col_name].to_numpy("datetime64[ns]")
+        )
+
+        return df
 
     def summarize_data_by_episode(
         self,
         df: pd.DataFrame,
         episode_id_col: str,
-        summary_function: callable,
+        summary_function: Callable | dict,
     ) -> pd.DataFrame:
         """
         Function that converts multiple rows of data into a single row of summary data for each episode.
@@ -155,8 +238,10 @@ class EpisodeCleaner(BaseCleaner):
             DataFrame containing a column with episode ids.
         episode_id_col : str
             The column name of the episode id.
-        summary_function : callable
+        summary_function : callable | dict
             A function that takes a dataframe as input and returns a dictionary containing the summary of the episode.
+            Alternatively a dictionary mapping column names to aggregation functions, e.g. {"had_dialysis": "max"},
+            which is passed to `DataFrameGroupBy.agg` and is much faster for many episodes.
 
         Returns
         -------
@@ -164,13 +249,11 @@ class EpisodeCleaner(BaseCleaner):
             A DataFrame containing the summary of each episode.
         """
 
-        summery_df = df.copy()
-
-        results = []
-
-        for episode_id, group in summery_df.groupby(episode_id_col):
-            result = summary_function(group)
-            results.append(result)
+        grouped = df.groupby(episode_id_col, observed=True)
 
-        return pd.DataFrame(results)
+        if isinstance(summary_function, dict):
+            return grouped.agg(summary_function).reset_index()
 
+        return pd.DataFrame.from_records(
+            [summary_function(group) for _, group in grouped]
+        )
@@ -1,4 +1,5 @@
 
+import numpy as np
 import pandas as pd
 from data_cleaning.cleaners.microbiology.microbiologyCleaner import MicrobiologyCleaner
 from data_cleaning.sir import find_sir_mic_variables_df, separate_sir_mic_data
@@ -25,22 +26,32 @@ class LIMSCleaner(MicrobiologyCleaner):
         pd.DataFrame
             DataFrame with the relevant column converted to timedelta64[ns] format.
         """
-        df = df.copy()
-        df[col_name] = df[col_name].str.replace('d', 'days').str.replace('h', 'hours').str.replace('m', 'minutes')
-        df[col_name] = pd.to_timedelta(df[col_name], errors='coerce')
+        ttd = df[col_name].astype(self._str_dtype)
 
-        return df
+        # Parse the days, hours and minutes directly into seconds
+        parts = ttd.str.extract(r"^\s*(?:(\d+)\s*d)?\s*(?:(\d+)\s*h)?\s*(?:(\d+)\s*m)?\s*$").astype("float64")
+        matched = parts.notna().any(axis=1)
+        seconds = parts.fillna(0).to_numpy() @ np.array([86400, 3600, 60])
+        converted = pd.to_timedelta(pd.Series(seconds, index=df.index).where(matched), unit='s')
+
+        # Values in any other format are left to the general timedelta parser
+        other = ~matched & ttd.notna()
+        if other.any():
+            other_ttd = ttd[other].str.replace('d', 'days').str.replace('h', 'hours').str.replace('m', 'minutes')
+            converted[other] = pd.to_timedelta(other_ttd.astype(object), errors='coerce')
+
+        return df.assign(**{col_name: converted})
 
 
     def clean_LIMS_data(self, df: pd.DataFrame) -> pd.DataFrame:
-        df = df.copy()
         df = remove_redundant_decimals(df)
         df = self.convert_to_timedelta(df, 'TTD TTD')
         df, df_sir = separate_sir_mic_data(df, ['Mikrobiologi_Prov_Alias', 'RS_PAT_Alias', 'Provtagningsdatum', 'species'])
-        df_sir = self.fill_sir_data(df = df_sir,sir_cols = find_sir_mic_variables_df(df_sir),groupby_cols=['RS_PAT_Alias','Provtagningsdatum','species'])
+        sir_cols = find_sir_mic_variables_df(df_sir)
+        df_sir = self.fill_sir_data(df = df_sir,sir_cols = sir_cols,groupby_cols=['RS_PAT_Alias','Provtagningsdatum','species'])
         df_sir = reshape_to_long_format(df_sir, ['Mikrobiologi_Prov_Alias', 'RS_PAT_Alias', 'Provtagningsdatum','species'],
-                                         find_sir_mic_variables_df(df_sir), 'Type of antibiotics', 'SIR')
+                                         sir_cols, 'Type of antibiotics', 'SIR')
         # add indicator that the data is from wwBakt
-        df["data_source"] = "LIMS"
+        df["data_source"] = self._data_source_column(len(df), "LIMS")
 
         return df, df_sir
@@ -1,3 +1,6 @@
+import re
+
+import numpy as np
 import pandas as pd
 
 from data_cleaning.cleaners.microbiology.microbiologyCleaner import MicrobiologyCleaner
@@ -26,35 +29,40 @@ class WWBaktCleaner(MicrobiologyCleaner):
 
         TODO: bottle_nr should not be set for other types of samples than blood cultures
         """
-        df = df.copy()
-
-        # find columns related to bottle 2.
-        # Uses the fact that there are a digit in  column names for bottle 2
-        bottle_2_cols = [
-            col
-            for col in df.columns
-            if "ttd" in col.lower() and any(c.isdigit() for c in col.lower())
-        ]
-        # find columns related to bottle 1 by removing the bottle 2 columns from the list of all TTD columns
-        bottle_1_cols = list(
-            set([col for col in df.columns if "ttd" in col.lower()])
-            - set(bottle_2_cols)
-        )
-
-        # separate the data
-        bottle_1_data = df.drop(columns=bottle_2_cols)
-        bottle_2_data = df.drop(columns=bottle_1_cols)
-
-        # rename the columns to match the bottle 1 columns
-        bottle_2_data.columns = bottle_1_data.columns
+        # find the columns related to each bottle in one pass over the TTD columns.
+        # Uses the fact that there are a digit in column names for bottle 2
+        bottle_1_cols, bottle_2_cols = [], []
+        for col in df.columns:
+            if "ttd" in col.lower():
+                if any(c.isdigit() for c in col):
+                    bottle_2_cols.append(col)
+                else:
+                    bottle_1_cols.append(col)
+
+        # pair each bottle 2 column with the bottle 1 column of the same name without the digits,
+        # e.g. "TTD Result 1" with "TTD Result"
+        bottle_2_by_name = {" ".join(re.sub(r"\d", "", col).split()): col for col in bottle_2_cols}
+        if sorted(bottle_2_by_name) != sorted(bottle_1_cols) or len(bottle_2_by_name) != len(bottle_2_cols):
+            raise ValueError("The TTD columns of bottle 1 and bottle 2 do not match")
+
+        # bottle 2 data is stored under the bottle 1 column names
+        bottle_1_columns = [col for col in df.columns if col not in bottle_2_cols]
+        bottle_2_columns = [bottle_2_by_name.get(col, col) for col in bottle_1_columns]
+
+        # stack the data of the two bottles column by column
+        data = {
+            col_1: pd.concat([df[col_1], df[col_2]], ignore_index=True)
+            for col_1, col_2 in zip(bottle_1_columns, bottle_2_columns)
+        }
 
         # add a column to indicate which bottle the data comes from.
         # This is only applicable for blood culture data
-        bottle_1_data["bottle_nr"] = "Flaska 1"
-        bottle_2_data["bottle_nr"] = "Flaska 2"
+        data["bottle_nr"] = pd.Categorical.from_codes(
+            np.repeat(np.array([0, 1], dtype="int8"), len(df)),
+            categories=["Flaska 1", "Flaska 2"],
+        )
 
-        # combine the data
-        df = pd.concat([bottle_1_data, bottle_2_data])
+        df = pd.DataFrame(data).set_axis(df.index.append(df.index))
 
 
         # If result is missing then set positive
@@ -80,25 +88,21 @@ class WWBaktCleaner(MicrobiologyCleaner):
         section_code: column where the section code can be found \n
         section_number: column where the section number can be found \n
         """
-        df = df.copy(deep=True)
-        # add the last two digits of the year to the DataFrame
-        df["labnr"] = df[year_col].map(int).map(str).str[2:4]
+        # the last two digits of the year
+        year = df[year_col].astype("int64").astype(self._str_dtype).str[2:4]
 
-        # add the section to the DataFrame
-        df["labnr"] = df["labnr"] + df[section_code]
-
-        # add the section number to the DataFrame
         # TODO: For now, the section number is assumed to be an float. This will later be changed to be an integer.
-        df["labnr"] = df["labnr"] + df[section_number].map(int).map(str)
+        number = df[section_number].astype("int64").astype(self._str_dtype)
 
-        return df
+        # concatenate the year, the section and the section number
+        labnr = year.str.cat([df[section_code].astype(self._str_dtype), number])
+
+        return df.assign(labnr=labnr)
 
     def convert_hours_to_datetime(self, hours):
         return pd.Timedelta(hours, unit="h")
 
     def clean_wwBakt_data(self, df: pd.DataFrame) -> tuple:
-        df = df.copy()
-
         df = remove_redundant_decimals(df)
 
         # seperate the sir data from the rest of the data
@@ -114,9 +118,10 @@ class WWBaktCleaner(MicrobiologyCleaner):
 
 
         # fill in SIR data
+        sir_cols = find_sir_mic_variables_df(sir_data)
         sir_data = self.fill_sir_data(
             df=sir_data,
-            sir_cols=find_sir_mic_variables_df(sir_data),
+            sir_cols=sir_cols,
             groupby_cols=["RS_PAT_Alias", "Prdate", "species"],
         )
 
@@ -124,7 +129,7 @@ class WWBaktCleaner(MicrobiologyCleaner):
         sir_data_long_format = reshape_to_long_format(
             sir_data,
             id_vars=["Mikrobiologi_Prov_Alias", "RS_PAT_Alias", "Prdate", "species"],
-            value_vars=find_sir_mic_variables_df(sir_data),
+            value_vars=sir_cols,
             var_name="Type of antibiotics",
             value_name="SIR",
         )
@@ -140,11 +145,13 @@ class WWBaktCleaner(MicrobiologyCleaner):
 
 
         # add indicator that the data is from wwBakt
-        wwbakt_data_lims["data_source"] = "wwBakt"
+        wwbakt_data_lims["data_source"] = self._data_source_column(
+            len(wwbakt_data_lims), "wwBakt"
+        )
 
         # The TTD column is in hours, convert to datetime
-        wwbakt_data_lims["TTD"] = wwbakt_data_lims["TTD"].apply(
-            self.convert_hours_to_datetime
+        wwbakt_data_lims["TTD"] = pd.to_timedelta(
+            wwbakt_data_lims["TTD"], unit="h", errors="coerce"
         )
 
         return wwbakt_data_lims, sir_data_long_format
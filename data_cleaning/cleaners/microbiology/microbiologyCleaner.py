@@ -1,14 +1,22 @@
 import pandas as pd
 import numpy as np
 from data_cleaning.cleaners.baseCleaner import BaseCleaner
-from data_cleaning.renaming import generate_rename_columns_json
-from data_cleaning.utils import save_json
 
 
 class MicrobiologyCleaner(BaseCleaner):
+    # Shared by all sources so the column stays categorical when the sources are concatenated
+    _data_source_dtype = pd.CategoricalDtype(["LIMS", "wwBakt"])
+
     def __init__(self):
         super().__init__()
 
+    def _data_source_column(self, n: int, data_source: str) -> pd.Categorical:
+        # Constant data source column stored as int8 codes instead of n Python strings
+        code = self._data_source_dtype.categories.get_loc(data_source)
+        return pd.Categorical.from_codes(
+            np.full(n, code, dtype="int8"), dtype=self._data_source_dtype
+        )
+
     def determine_episode(
         self,
         df: pd.DataFrame,
@@ -58,10 +66,21 @@ class MicrobiologyCleaner(BaseCleaner):
         # Sort the DataFrame based on the specified variables
         df = df.sort_values(by=columns_to_sort_by).reset_index(drop=True)
 
+        # Order the rows by patient while keeping the sorted order within each patient, so that both the
+        # time differences and the episode numbers can be computed in single passes over contiguous patients
+        patient_codes, patient_ids = pd.factorize(df[patient_id_col_name])
+        order = np.argsort(patient_codes, kind="stable")
+        patient = patient_codes[order]
+        first_of_patient = np.ones(len(df), dtype=bool)
+        first_of_patient[1:] = patient[1:] != patient[:-1]
+        missing_patient = patient == -1
+
         # Calculate the time difference (in days) between consecutive samples for each patient
-        df["days_diff"] = (
-            df.groupby(patient_id_col_name)[sample_date_col_name].diff().dt.days
-        )
+        sample_date = df[sample_date_col_name].to_numpy("datetime64[ns]")[order]
+        days_diff = np.empty(len(df), dtype="timedelta64[ns]")
+        days_diff[order[1:]] = sample_date[1:] - sample_date[:-1]
+        days_diff[order[first_of_patient | missing_patient]] = np.timedelta64("NaT")
+        df["days_diff"] = pd.Series(days_diff, index=df.index).dt.days
 
         # A new episode starts when:
         # 1. The patient ID changes (indicated by a large change in 'days_diff' or NaN in diff)
@@ -70,15 +89,20 @@ class MicrobiologyCleaner(BaseCleaner):
             df[patient_id_col_name] != df[patient_id_col_name].shift(1, fill_value=0)
         ) | (df["days_diff"] > time)
 
-        # Use cumulative sum of the new episode indicator to assign episode numbers
-        df["episode_nr"] = (
-            new_episode.groupby(df[patient_id_col_name]).cumsum().astype(int)
+        # Use cumulative sum of the new episode indicator, restarted for each patient, to assign episode numbers
+        new_episode = new_episode.to_numpy(dtype="int64")[order]
+        new_episodes = new_episode.cumsum()
+        before_patient = np.maximum.accumulate(
+            np.where(first_of_patient, new_episodes - new_episode, 0)
         )
+        episode_nr = np.empty(len(df), dtype="float64")
+        episode_nr[order] = np.where(missing_patient, np.nan, new_episodes - before_patient)
+        df["episode_nr"] = pd.Series(episode_nr, index=df.index).astype(int)
 
-        # Generate the 'episode_id' by concatenating patient ID and episode number
-        df["episode_id"] = df[patient_id_col_name].astype(str) + '_' + df[
-            "episode_nr"
-        ].astype(int).astype(str)
+        # Generate the 'episode_id' by concatenating patient ID and episode number,
+        # each patient ID is converted to a string only once
+        patient_id = pd.Series(patient_ids.astype(str).to_numpy()[patient_codes], index=df.index)
+        df["episode_id"] = patient_id + "_" + df["episode_nr"].astype(str)
 
         return df
 
@@ -89,13 +113,11 @@ class MicrobiologyCleaner(BaseCleaner):
         Separates blood samples from other types of samples. Returns a DataFrame with the separated blood samples.
         """
 
-        extracted_df = df.copy()
-        extracted_df = extracted_df[
-            extracted_df[variable_name]
-            .astype(str)
-            .str.contains(keyword, case=False, na=False)
+        return df[
+            df[variable_name]
+            .astype(self._str_dtype)
+            .str.contains(keyword, case=False, regex=False, na=False)
         ]
-        return extracted_df
 
     def flag_contaminants(
         self, df: pd.DataFrame, variable_name: str, contaminants: list
@@ -103,9 +125,7 @@ class MicrobiologyCleaner(BaseCleaner):
         """
         Flags samples that contain contaminants from the provided list. Adds a new a column of booleans.
         """
-        df = df.copy()
-        df["flag_contaminants"] = df[variable_name].isin(contaminants)
-        return df
+        return df.assign(flag_contaminants=df[variable_name].isin(contaminants))
 
     def filter_TTP(
         self, df: pd.DataFrame, ttp_col_name: str, limit: pd.Timedelta
@@ -127,9 +147,7 @@ class MicrobiologyCleaner(BaseCleaner):
         pd.DataFrame
             DataFrame with rows removed where TTP is above `limit`.
         """
-        df = df.copy()
-        df = df[(df[ttp_col_name].isna()) | (df[ttp_col_name] < limit)]
-        return df
+        return df[(df[ttp_col_name].isna()) | (df[ttp_col_name] < limit)]
 
     def add_ttp(
         self,
@@ -161,19 +179,23 @@ class MicrobiologyCleaner(BaseCleaner):
             DataFrame with TTP column added.
         """
 
-        df = df.copy()
-
         # Case 1: If TTD exists and result is positive or missing, set TTP as TTD.
         condition1 = (
-            ~df[result_col_name].str.contains("neg", na=False, case=False)
+            ~df[result_col_name]
+            .astype(self._str_dtype)
+            .str.contains("neg", case=False, regex=False, na=False)
             & df[ttd_col_name].notna()
         )
 
-        df["TTP"] = np.nan
-        df["TTP"] = pd.to_timedelta(df["TTP"])
-
         # Apply Case 1: Set TTP to TTD for non negative results where TTD exists
-        df.loc[condition1, "TTP"] = df.loc[condition1, ttd_col_name]
+        ttp = pd.Series(
+            np.where(
+                condition1.to_numpy(),
+                df[ttd_col_name].to_numpy("timedelta64[ns]"),
+                np.timedelta64("NaT", "ns"),
+            ),
+            index=df.index,
+        )
 
         # Case 2: Set TTP as the difference between 'result_date' and 'arrival_date'
         # if result is positive or missing, and TDD is missing.
@@ -182,16 +204,39 @@ class MicrobiologyCleaner(BaseCleaner):
         # Apply Case 2: Set TTP as the date difference for non negative results where TTD is missing
         # df.loc[condition2, 'TTP'] = (df[result_date_col_name] - df[incubation_date_col_name]).dt.days
         # df.loc[condition2, 'TTP'] = pd.to_timedelta(df[result_date_col_name] - df[incubation_date_col_name])
-        df["TTP_hours"] = df["TTP"].dt.total_seconds() / 3600
 
-        return df
+        return df.assign(TTP=ttp, TTP_hours=ttp.dt.total_seconds() / 3600)
 
     def fill_sir_data(self, df, sir_cols, groupby_cols):
-        df = df.copy()
+        # Fill within each group from the closest preceding value, otherwise from the closest following value.
+        # The groups are made contiguous by a stable sort so that all columns can be filled in a single pass
+        group = df.groupby(groupby_cols, dropna=False, sort=False).ngroup().to_numpy()
+        order = np.argsort(group, kind="stable")
+        group = group[order]
+        positions = np.arange(len(df))
+
+        filled = {}
+        for col in sir_cols:
+            has_value = df[col].notna().to_numpy()[order]
+            previous = np.maximum.accumulate(np.where(has_value, positions, -1))
+            following = np.minimum.accumulate(np.where(has_value, positions, len(df))[::-1])[::-1]
+
+            source = np.full(len(df), -1)
+            use_following = following < len(df)
+            use_following[use_following] = group[following[use_following]] == group[use_following]
+            source[use_following] = following[use_following]
+            use_previous = previous >= 0
+            use_previous[use_previous] = group[previous[use_previous]] == group[use_previous]
+            source[use_previous] = previous[use_previous]
+
+            # map the sorted positions back to the rows of df
+            source_row = np.full(len(df), -1)
+            source_row[order] = np.where(source >= 0, order[source], -1)
+            filled[col] = (
+                df[col].take(np.maximum(source_row, 0)).set_axis(df.index).where(source_row >= 0)
+            )
 
-        df[sir_cols] = df.groupby(groupby_cols, dropna=False)[sir_cols].ffill()
-        df[sir_cols] = df.groupby(groupby_cols, dropna=False)[sir_cols].bfill()
-        return df
+        return df.assign(**filled)
 
     def set_contaminant_relevant(
         self,
@@ -232,33 +277,39 @@ class MicrobiologyCleaner(BaseCleaner):
         A DataFrame containing a new column `relevant` indicating whether the finding is relevant or not according to the method used.
         """
 
-        df = df.copy()
         mask = df[potential_contaminant_col] == True
 
-        df["relevant"] = None
+        # Findings are relevant unless they are a potential contaminant that is found to be not relevant
+        relevant = np.ones(len(df), dtype=bool)
 
         if method == "bottle":
-            df.loc[mask, "relevant"] = ~(
+            relevant[mask.to_numpy()] = ~(
                 df.loc[mask]
-                .groupby([patient_id_col, sample_date_col, species_col])[labnr_col]
+                .groupby([patient_id_col, sample_date_col, species_col], observed=True, sort=False)[labnr_col]
                 .transform("count")
                 < 3
-            )
+            ).to_numpy()
         elif method == "labnr":
-            df.loc[mask, "relevant"] = ~(
-                df.loc[mask]
-                .groupby([patient_id_col, sample_date_col, species_col])[labnr_col]
-                .transform("nunique")
-                == 1
+            # The finding is relevant unless it is found in a single bottle set. Comparing the smallest and largest
+            # factorized lab number of each group is cheaper than counting the unique lab numbers
+            potential_contaminants = df.loc[mask]
+            labnr = pd.Series(
+                pd.factorize(potential_contaminants[labnr_col])[0], index=potential_contaminants.index
+            ).replace(-1, np.nan)
+            grouped_labnr = labnr.groupby(
+                [potential_contaminants[col] for col in (patient_id_col, sample_date_col, species_col)],
+                observed=True,
+                sort=False,
             )
+            relevant[mask.to_numpy()] = (
+                grouped_labnr.transform("min") != grouped_labnr.transform("max")
+            ).to_numpy()
         elif method == "potential_contaminant":
-            df.loc[mask, "relevant"] = False
+            relevant[mask.to_numpy()] = False
         else:
             raise ValueError("Choose a method")
 
-        df["relevant"] = df["relevant"].fillna(True)
-
-        return df
+        return df.assign(relevant=relevant)
 
     def set_mono_poly_contamination(
         self,
@@ -296,52 +347,63 @@ class MicrobiologyCleaner(BaseCleaner):
             A DataFrame containing a new column `mono_poly_contamination` indicating whether the finding is mono, poly or contamination.
         """
 
-        df = df.copy()
-        df["is_relevant"] = df["relevant"] == True
-        df["is_non_relevant"] = df["relevant"] == False
-
-        # Deduplication data so that the same finding is not counted multiple times
-        dedup = df.drop_duplicates(
-            subset=[patient_id_col, sample_date_col, species_col]
+        # Only the first occurrence of a finding is counted so that the same finding is not counted multiple times
+        first_finding = ~df.duplicated(subset=[patient_id_col, sample_date_col, species_col])
+        findings = pd.DataFrame(
+            {
+                "nr_relevant_findings": (df["relevant"] == True) & first_finding,
+                "nr_non_relevant_findings": (df["relevant"] == False) & first_finding,
+            }
         )
 
-        # Count relevant and non-relevant findings per patient and sample date
-        counts = (
-            dedup.groupby([patient_id_col, sample_date_col])[
-                ["is_relevant", "is_non_relevant"]
-            ]
-            .sum()
-            .rename(
-                columns={
-                    "is_relevant": "nr_relevant_findings",
-                    "is_non_relevant": "nr_non_relevant_findings",
-                }
-            )
-            .reset_index()
+        # Count relevant and non-relevant findings per patient and sample date and add them to the dataframe
+        counts = findings.groupby(
+            [df[patient_id_col], df[sample_date_col]], observed=True, sort=False
+        ).transform("sum")
+        df = df.assign(**counts)
+
+        # Classify the findings from the counts of relevant and non-relevant findings
+        nr_relevant = df["nr_relevant_findings"].to_numpy()
+        nr_non_relevant = df["nr_non_relevant_findings"].to_numpy()
+        classification = np.select(
+            [
+                (nr_relevant == 0) & (nr_non_relevant > 0),
+                nr_relevant > 1,
+                nr_relevant == 1,
+            ],
+            ["cont", "poly", "mono"],
+            default="",
         )
-        # Add counts to the dataframe
-        df = df.merge(counts, on=[patient_id_col, sample_date_col], how="left")
-
-        # function for classification of findings
-        def classify_finding(row):
-            if row["nr_relevant_findings"] == 0 and row["nr_non_relevant_findings"] > 0:
-                return "cont"
-            elif row["nr_relevant_findings"] > 1:
-                return "poly"
-            elif row["nr_relevant_findings"] == 1:
-                return "mono"
-
+        if (classification == "").any():
             raise ValueError("This should not happen")
 
         # Create a helper column which stores the classification
-        df["mono_poly_contamination"] = df.apply(classify_finding, axis=1)
+        df["mono_poly_contamination"] = pd.Categorical(
+            classification, categories=["mono", "poly", "cont"]
+        )
 
         # If the finding is not relevant then set the classification to contamination
-        df.loc[df["is_non_relevant"], "mono_poly_contamination"] = "cont"
+        df.loc[df["relevant"] == False, "mono_poly_contamination"] = "cont"
 
-        df = df.drop(columns=["is_relevant", "is_non_relevant"])
         return df
 
+    def _join_unique_values(
+        self, df: pd.DataFrame, group_cols: list, values: pd.Series
+    ) -> pd.DataFrame:
+        # The sorted unique non-missing values of each group joined with " | ", groups without values get ""
+        groups = df[group_cols].dropna().drop_duplicates()
+        has_value = values.notna()
+        joined = (
+            df.loc[has_value, group_cols]
+            .assign(value=values[has_value])
+            .drop_duplicates()
+            .sort_values("value")
+            .groupby(group_cols, observed=True, sort=False)["value"]
+            .agg(" | ".join)
+            .reset_index()
+        )
+        return groups.merge(joined, on=group_cols, how="left").fillna({"value": ""})
+
     def flag_polymicrobial(
         self,
         df: pd.DataFrame,
@@ -377,43 +439,38 @@ class MicrobiologyCleaner(BaseCleaner):
             A DataFrame containing two new columns `polymicrobial` and `which_polymicrobial` indicating whether the finding is polymicrobial or not and which findings are polymicrobial.
         """
 
-        df = df.copy()
-        df["polymicrobial"] = df["mono_poly_contamination"] == "poly"
-        df["which_polymicrobial"] = None
+        group_cols = [patient_id_col, sample_date_col]
 
-        mask = df["polymicrobial"]
+        df = df.assign(
+            polymicrobial=df["mono_poly_contamination"] == "poly",
+            which_polymicrobial=None,
+        )
 
-        df.loc[mask, "which_polymicrobial"] = (
-            df[mask]
-            .groupby([patient_id_col, sample_date_col])[species_col]
-            .transform(
-                lambda x: " | ".join(
-                    sorted(
-                        set(str(val).replace("&", "") for val in x if pd.notnull(val))
-                    )
-                )
-            )
+        mask = df["polymicrobial"]
+        poly = df.loc[mask, group_cols]
+
+        which_polymicrobial = self._join_unique_values(
+            poly,
+            group_cols,
+            df.loc[mask, species_col].astype(str).str.replace("&", "", regex=False).where(
+                df.loc[mask, species_col].notna()
+            ),
         )
+        df.loc[mask, "which_polymicrobial"] = poly.merge(
+            which_polymicrobial, on=group_cols, how="left"
+        )["value"].to_numpy()
+
         # My thought is that these sample ids can be used for accessing SIR data if needed
         # TODO: add parameter for sample_id column
-        which_sample_ids_df = (
-            df.groupby([patient_id_col, sample_date_col])
-            .apply(
-                lambda g: " | ".join(
-                    sorted(
-                        set(
-                            f"{row['species']}:{row['sample_id']}"
-                            for _, row in g.iterrows()
-                            if pd.notnull(row["sample_id"]) and pd.notnull(row["species"])
-                        )
-                    )
-                )
-            )
-            .reset_index(name="which_sample_ids")
+        sample_id_pairs = (df["species"].astype(str) + ":" + df["sample_id"].astype(str)).where(
+            df["species"].notna() & df["sample_id"].notna()
         )
+        which_sample_ids_df = self._join_unique_values(
+            df, group_cols, sample_id_pairs
+        ).rename(columns={"value": "which_sample_ids"})
 
         # make sure all rows contain the column which_sample_ids
-        df = df.merge(which_sample_ids_df, on=[patient_id_col, sample_date_col], how="left")
+        df = df.merge(which_sample_ids_df, on=group_cols, how="left")
 
 
         df["polymicrobial"] = df["polymicrobial"].fillna(False)
@@ -447,11 +504,11 @@ class MicrobiologyCleaner(BaseCleaner):
         pd.DataFrame
             DataFrame with new column added.
         """
-        df = df.copy()
-        df["polymicrobial"] = df.groupby([episode_id_col])[
-            microorganism_id_col
-        ].transform(lambda x: x.nunique() > 1)
-        return df
+        # rows without an episode id have no group and are left missing
+        nr_microorganisms = df.groupby(episode_id_col)[microorganism_id_col].transform("nunique")
+        return df.assign(
+            polymicrobial=(nr_microorganisms > 1).where(nr_microorganisms.notna())
+        )
         
 
     def classify_microbiological_findings(
@@ -507,17 +564,19 @@ class MicrobiologyCleaner(BaseCleaner):
         pd.DataFrame
             A DataFrame containing the new columns `relevant`, `mono_poly_contamination`, `polymicrobial`, `which_polymicrobial` and `which_sample_ids`.
         """
-        df = df.copy()
-
         # Mask for getting the rows with positive findings
         mask = (
             df[outcome_col]
+            .astype(self._str_dtype)
             .str.lower()
             .str.startswith(outcome_positive_prefix, na=False)
         )
 
         # Subset of the data containing only positive findings
-        subset = df.loc[mask].copy()
+        subset = df.loc[mask]
+
+        # The steps below group by patient and species many times, which is faster on integer category codes
+        subset = subset.astype({patient_id_col: "category", species_col: "category"})
 
         subset = self.set_contaminant_relevant(
             subset,
@@ -544,7 +603,15 @@ class MicrobiologyCleaner(BaseCleaner):
             labnr_col=labnr_col,
         )
 
-        # Update positive rows
-        df.loc[mask, subset.columns] = subset[subset.columns].values
-
-        return df
+        # Add the new columns to the original DataFrame column by column so that their dtypes are kept,
+        # rows without a positive finding get missing values
+        positions = np.flatnonzero(mask.to_numpy(dtype=bool))
+        rows = np.arange(len(df))
+        new_columns = subset.columns.difference(df.columns, sort=False)
+
+        return df.assign(
+            **{
+                col: subset[col].set_axis(positions).reindex(rows).set_axis(df.index)
+                for col in new_columns
+            }
+        )
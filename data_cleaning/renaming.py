@@ -1,7 +1,11 @@
+import numpy as np
 import pandas as pd
 import json
+import os
+from functools import lru_cache
+from types import MappingProxyType
 
-from data_cleaning.utils import load_json, save_json
+from data_cleaning.utils import load_json, load_json_cached, save_json
 from data_cleaning.sir import (
     convert_wwbakt_to_lims_sir_mic,
     find_sir_mic_variables_df,
@@ -9,6 +13,33 @@ from data_cleaning.sir import (
 )
 
 
+@lru_cache(maxsize=64)
+def _load_value_lookups_cached(path: str, mtime: float) -> MappingProxyType:
+    # For each variable the values to rename and their new names, values with an empty replacement are kept unchanged
+    lookups = {}
+    for var, values in load_json_cached(path).items():
+        mapping = {value: new_value for value, new_value in values.items() if new_value != ""}
+        lookups[var] = (pd.Index(list(mapping), dtype=object), np.array(list(mapping.values()), dtype=object))
+    return MappingProxyType(lookups)
+
+
+def _rename_categories(column: pd.Series, values: pd.Index, new_values: np.ndarray) -> pd.Series:
+    # Only the categories are looked up, the codes of the column are kept
+    categories = column.cat.categories
+    positions = values.get_indexer(categories)
+    new_categories = pd.Index(np.where(positions == -1, categories.astype(object), new_values[positions]))
+    if new_categories.is_unique:
+        return column.cat.rename_categories(new_categories)
+
+    # categories renamed to the same value are merged into one category
+    renamed = new_categories.take(column.cat.codes.to_numpy(), allow_fill=True, fill_value=np.nan)
+    return pd.Series(
+        pd.Categorical(renamed, categories=new_categories.unique(), ordered=column.cat.ordered),
+        index=column.index,
+        name=column.name,
+    )
+
+
 def generate_rename_columns_json(df: pd.DataFrame) -> str:
     """
     Generates a JSON object with all column names,
@@ -52,8 +83,7 @@ def rename_columns(df: pd.DataFrame, path: str) -> pd.DataFrame:
     """
     Renames the variables in a DataFrame according to the rename file.
     """
-    df = df.copy()
-    rename_dict = load_json(path)
+    rename_dict = load_json_cached(path)
     columns_to_keep = [col for col in df.columns if rename_dict[col] != "remove"]
     df = df[columns_to_keep]
     df = df.rename(columns=lambda x: rename_dict[x] if rename_dict[x] != "" else x)
@@ -108,7 +138,9 @@ def generate_rename_values_json(df: pd.DataFrame, limit: int) -> json:
     """
     d = dict()
     for col in sorted(df.select_dtypes(include=["object"]).columns):
-        values = df[col].dropna().unique()
+        # missing values are removed from the unique values rather than from the whole column
+        values = df[col].unique()
+        values = values[pd.notna(values)]
         if len(values) < limit:
             d[col] = {value: "" for value in sorted(values,key=lambda x: x.lower())}
 
@@ -136,14 +168,25 @@ def rename_values(df: pd.DataFrame, path: str) -> pd.DataFrame:
     """
     Renames the values in a DataFrame according to a JSON file.
     """
-    renamed_df = df.copy()
-    rename_dict = load_json(path)
-
-    for var in rename_dict:
-        renamed_df[var] = renamed_df[var].apply(
-            lambda x: (
-                rename_dict[var].get(x, x) if rename_dict[var].get(x, x) != "" else x
-            )
-        )
-
-    return renamed_df
+    # The rename files are read many times in a pipeline, the lookups are rebuilt only if the file has been modified
+    path = os.path.abspath(path)
+    lookups = _load_value_lookups_cached(path, os.path.getmtime(path))
+
+    renamed = {}
+    for var, (values, new_values) in lookups.items():
+        column = df[var]
+        if values.empty:
+            continue
+
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            renamed[var] = _rename_categories(column, values, new_values)
+            continue
+        if pd.api.types.is_extension_array_dtype(column.dtype):
+            # extension arrays can not hold every replacement, e.g. a new category or a string in a numeric column
+            column = column.astype(object)
+
+        # a single hash lookup per value gives the position of its replacement, -1 if there is none
+        positions = values.get_indexer(column)
+        renamed[var] = column.where(positions == -1, new_values[positions])
+
+    return df.assign(**renamed)
@@ -8,10 +8,9 @@ def find_sir_mic_variables_df(
     """
     Finds all variables containing SIR and MIC values.
     """
+    sir_id, mic_id = sir_id.lower(), mic_id.lower()
     sir_mic_variables = [
-        col
-        for col in df.columns
-        if sir_id.lower() in col.lower() or mic_id.lower() in col.lower()
+        col for col in df.columns if sir_id in (lowered := col.lower()) or mic_id in lowered
     ]
     return sir_mic_variables
 
@@ -20,17 +19,12 @@ def find_sir_mic_variables_dict(
     rename_list: dict, sir_id: str = "Sir", mic_id: str = "Mic"
 ) -> tuple:
 
-    sir_mic_variables = [
-        col
-        for col in rename_list
-        if sir_id.lower() in col.lower() or mic_id.lower() in col.lower()
-    ]
-    sir_variables = [
-        col
-        for col in rename_list
-        if sir_id.lower() in col.lower() and mic_id.lower() not in col.lower()
-    ]
-    mic_variables = list(set(sir_mic_variables) - set(sir_variables))
+    sir_id, mic_id = sir_id.lower(), mic_id.lower()
+    lowered = [(col, col.lower()) for col in rename_list]
+
+    # a variable is a MIC variable if it contains the MIC id, otherwise a SIR variable if it contains the SIR id
+    sir_variables = [col for col, name in lowered if sir_id in name and mic_id not in name]
+    mic_variables = [col for col, name in lowered if mic_id in name]
 
     return sir_variables, mic_variables
 
@@ -1,22 +1,78 @@
+import logging
+
+import numpy as np
 import pandas as pd
 
+logger = logging.getLogger(__name__)
+
+# Common date formats to try, in order
+_DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y%m%d", "%d-%m-%Y", "%m/%d/%Y")
+
 
 def remove_redundant_decimals(df: pd.DataFrame) -> pd.DataFrame:
     """
     Removes redundant zeros and dots from values in the DataFrame. Only applied to columns of numbers
     without decimals, while handling NaN values properly.
     """
-    converted_df = df.copy()
+    converted_columns = {}
+
+    for col in df.select_dtypes(include=["number"]).columns:
+        values = df[col]
+
+        if isinstance(values.dtype, np.dtype) and values.dtype.kind in "iu":
+            # integer columns can always be converted
+            converted_columns[col] = values.astype("Int64")
+            continue
 
-    df_numbers = converted_df.select_dtypes(include=["number"]).copy()
+        if not (isinstance(values.dtype, np.dtype) and values.dtype.kind == "f"):
+            # nullable extension dtypes are checked on the pandas values
+            if (values.dropna() == values.dropna().astype(int)).all():
+                converted_columns[col] = values.astype("Int64")
+            continue
 
-    for col in df_numbers.columns:
         # Check if all non-NaN values in the column can be converted to integers without loss
-        if (df_numbers[col].dropna() == df_numbers[col].dropna().astype(int)).all():
+        arr = values.to_numpy()
+        is_missing = np.isnan(arr)
+        present = arr[~is_missing]
+        if np.all((np.floor(present) == present) & (np.abs(present) < 2**63)):
             # int cant handle NaN values, Int64 is needed
-            converted_df[col] = df_numbers[col].astype("Int64")
+            converted_columns[col] = pd.arrays.IntegerArray(
+                np.where(is_missing, 0, arr).astype(np.int64), is_missing
+            )
+
+    return df.assign(**converted_columns)
+
+
+def _remove_timezone(values: pd.Series) -> pd.Series:
+    """
+    Removes the timezone from datetime values, naive values are returned as they are.
+    """
+    if values.dt.tz is None:
+        return values
+    return values.dt.tz_localize(None)
 
-    return converted_df
+
+def _parse_dates(values: pd.Series, date_formats: tuple) -> pd.Series | None:
+    """
+    Parses the values with the first of the date formats that fits all values, with the timezone removed.
+    Returns None if none of the formats fit.
+    """
+    # A format that fails on the first value fails on the whole column, so every format is
+    # first tried on that value alone and the column is only parsed with the formats that fit it
+    present = values.notna().to_numpy()
+    first_value = values.iloc[[present.argmax()]] if present.any() else None
+
+    for date_format in date_formats:
+        try:
+            if first_value is not None:
+                pd.to_datetime(first_value, format=date_format, errors="raise")
+            parsed = pd.to_datetime(values, format=date_format, errors="raise")
+        except (ValueError, TypeError):
+            continue  # Try the next date format if the current one fails
+
+        return _remove_timezone(parsed)
+
+    return None
 
 
 def convert_to_datetime(
@@ -40,10 +96,7 @@ def convert_to_datetime(
     pd.DataFrame
         The DataFrame with applicable columns converted to datetime.
     """
-    # List of common date formats to try
-    date_formats = ["%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y%m%d", "%d-%m-%Y", "%m/%d/%Y"]
-
-    df = df.copy()
+    converted_columns = {}
 
     if len(columns_to_convert) == 0:
         columns = df.columns
@@ -53,19 +106,18 @@ def convert_to_datetime(
     for col in columns:
         # Check if the column name contains 'date' or if the dtype suggests it's a date
         if "date" in col.lower() or pd.api.types.is_object_dtype(df[col]):
-            for date_format in date_formats:
-                try:
-                    df[col] = pd.to_datetime(
-                        df[col], format=date_format, errors="raise"
-                    )
-                    # remove tz
-                    df[col] = df[col].dt.tz_localize(None)
-                    print(f"Column '{col}' successfully converted to datetime.")
-                    break  # Stop after the first successful conversion
-                except (ValueError, TypeError):
-                    continue  # Try the next date format if the current one fails
+            if pd.api.types.is_datetime64_any_dtype(df[col]):
+                # Already parsed, only the timezone has to be removed
+                converted_columns[col] = _remove_timezone(df[col])
+                logger.debug("Column '%s' successfully converted to datetime.", col)
+                continue
+
+            converted = _parse_dates(df[col], _DATE_FORMATS)
+            if converted is not None:
+                converted_columns[col] = converted
+                logger.debug("Column '%s' successfully converted to datetime.", col)
 
-    return df
+    return df.assign(**converted_columns)
 
 
 def convert_to_datetime_with_keyword(
@@ -89,10 +141,7 @@ def convert_to_datetime_with_keyword(
     pd.DataFrame
         The DataFrame with applicable columns converted to datetime.
     """
-    # List of common date formats to try
-    date_formats = ["%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y%m%d", "%d-%m-%Y", "%m/%d/%Y"]
-
-    df = df.copy()
+    converted_columns = {}
 
     if len(columns_to_convert) == 0:
         columns = df.columns
@@ -102,19 +151,18 @@ def convert_to_datetime_with_keyword(
     for col in columns:
         # Check if the column name contains 'date' or if the dtype suggests it's a date
         if keyword in col.lower() or pd.api.types.is_object_dtype(df[col]):
-            for date_format in date_formats:
-                try:
-                    df[col] = pd.to_datetime(
-                        df[col], format=date_format, errors="raise"
-                    )
-                    # remove tz
-                    df[col] = df[col].dt.tz_localize(None)
-                    print(f"Column '{col}' successfully converted to datetime.")
-                    break  # Stop after the first successful conversion
-                except (ValueError, TypeError):
-                    continue  # Try the next date format if the current one fails
+            if pd.api.types.is_datetime64_any_dtype(df[col]):
+                # Already parsed, only the timezone has to be removed
+                converted_columns[col] = _remove_timezone(df[col])
+                logger.debug("Column '%s' successfully converted to datetime.", col)
+                continue
+
+            converted = _parse_dates(df[col], _DATE_FORMATS)
+            if converted is not None:
+                converted_columns[col] = converted
+                logger.debug("Column '%s' successfully converted to datetime.", col)
 
-    return df
+    return df.assign(**converted_columns)
 
 
 def reshape_to_long_format(
@@ -131,15 +179,24 @@ def reshape_to_long_format(
     value_vars: list of columns to unpivot \n
     var_name: name of the column to store the variable names
     """
-    # function for unpivoting the data
-    df = df.melt(
-        id_vars=id_vars,
-        value_vars=value_vars,
-        var_name=var_name,
-        value_name=value_name,
-    )
-    df = df.dropna()
-    return df
+    if len(value_vars) == 0:
+        return df.melt(id_vars=id_vars, value_vars=value_vars, var_name=var_name, value_name=value_name).dropna()
+
+    # Unpivot one variable at a time and only keep the rows without missing values, so that the rows
+    # that would be dropped are never built. The index is the same as from melt followed by dropna
+    ids = df[id_vars]
+    has_ids = ids.notna().all(axis=1).to_numpy()
+
+    long_df = []
+    for i, var in enumerate(value_vars):
+        rows = np.flatnonzero(has_ids & df[var].notna().to_numpy())
+        long_df.append(
+            ids.iloc[rows]
+            .set_axis(i * len(df) + rows)
+            .assign(**{var_name: var, value_name: df[var].to_numpy()[rows]})
+        )
+
+    return pd.concat(long_df)
 
 
 
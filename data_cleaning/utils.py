@@ -1,5 +1,8 @@
 import pandas as pd
 import json
+import os
+from functools import lru_cache
+from types import MappingProxyType
 
 
 def save_json(j: json, path: str):
@@ -23,14 +26,27 @@ def load_json(path: str) -> dict:
     return rename_dict
 
 
+@lru_cache(maxsize=128)
+def _load_json_cached(path: str, mtime: float) -> MappingProxyType:
+    return MappingProxyType(load_json(path))
+
+
+def load_json_cached(path: str) -> MappingProxyType:
+    """
+    Load json from the specified path, reusing earlier loads of the file as long as it has not been modified.
+    The returned mapping is shared between callers and therefore read-only, use `load_json` to get a dict to modify.
+    """
+    path = os.path.abspath(path)
+    return _load_json_cached(path, os.path.getmtime(path))
+
+
 def convert_variable_to_snakecase(df: pd.DataFrame) -> pd.DataFrame:
     """
     Converts the column names in a DataFrame to snake_case.
     """
-    df = df.copy(deep=True)
-    columns = df.columns
-    columns = [col.lower().replace(" ", "_") for col in columns]
-    df.columns = columns
+    # Only the column names change, so the data is shared with the original DataFrame
+    df = df.copy(deep=False)
+    df.columns = [col.lower().replace(" ", "_") for col in df.columns]
     return df
 
 
@@ -47,18 +63,11 @@ def generate_mapping_alias_to_baseline(
                                        cols_to_sort=["patient_id", "date_of_sampling"],
                                        baseline="date_of_sampling")
     """
-    df = df.copy()
+    # Group by the alias column, the base line will be the minimum date.
+    # The minimum does not depend on the row order, so cols_to_sort is not needed to sort the data
+    baselines = df.groupby(alias_col)[baseline].min()
 
-    df = df.sort_values(by=cols_to_sort)
-
-    mapping = df[[alias_col, baseline]]
-
-    mapping = mapping.drop_duplicates()
-
-    # Group by the alias column, the base line will be the minimum date
-    baselines = mapping.groupby(alias_col).min().reset_index()
-
-    mapping_dict = dict(zip(baselines[alias_col], baselines[baseline].astype(str)))
+    mapping_dict = dict(zip(baselines.index, baselines.astype(str)))
 
     mapping_json = json.dumps(mapping_dict)
 
@@ -70,9 +79,7 @@ def generate_mapping_alias_to_alias(df: pd.DataFrame, aliases: list) -> json:
     Function that generates a mapping a dictionary that maps a alias id to another alias id.
 
     """
-    df = df.copy()
-
-    mapping_dict = dict(zip(df[aliases[0]].astype(str), df[aliases[1]].astype(str)))
+    mapping_dict = generate_mapping_alias_to_alias_dict(df, aliases[0], aliases[1])
 
     mapping_json = json.dumps(mapping_dict)
 
@@ -84,8 +91,10 @@ def generate_mapping_alias_to_alias_dict(df: pd.DataFrame, from_alias:str, to_al
     Function that generates a mapping a dictionary that maps a alias id to another alias id.
 
     """
-    df = df.copy()
+    # The ids are repeated on many rows, only the last occurrence of each pair decides the mapping.
+    # The mapping is the same as for all rows since later rows overwrite earlier ones
+    pairs = df[[from_alias, to_alias]].drop_duplicates(keep="last")
 
-    mapping_dict = dict(zip(df[from_alias].astype(str), df[to_alias].astype(str)))
+    mapping_dict = dict(zip(pairs[from_alias].astype(str), pairs[to_alias].astype(str)))
 
     return mapping_dict
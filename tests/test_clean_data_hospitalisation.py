@@ -0,0 +1,48 @@
+import pandas as pd
+
+from data_cleaning.cleaners.episode.clean_data_hospitalisation import HospitalisationCleaner
+from data_cleaning.cleaners.episode.clean_data_outcomes import OutcomesCleaner
+
+
+def _hospitalisations():
+    return HospitalisationCleaner().clean_hosp_data(
+        pd.DataFrame(
+            {
+                "patient_id": [1, 1, 2],
+                "hosp_start": pd.to_datetime(["2020-01-01", "2020-02-01", "2020-01-01"]),
+                "hosp_stop": pd.to_datetime(["2020-01-10", "2020-02-10", None]),
+                "hosp_type": ["Slutenvård", "Slutenvård", "Slutenvård"],
+            }
+        )
+    )
+
+
+def test_clean_hosp_data_stores_seconds():
+    hospitalisations = _hospitalisations()
+
+    assert len(hospitalisations) == 2
+    assert hospitalisations["hosp_start"].dtype == "datetime64[s]"
+    assert hospitalisations["hosp_stop"].dtype == "datetime64[s]"
+
+
+def test_second_resolution_joins_with_nanosecond_data():
+    hospitalisations = _hospitalisations()
+    samples = pd.DataFrame(
+        {
+            "episode_id": [1, 2],
+            "patient_id": [1, 1],
+            "sample_date": pd.to_datetime(["2020-01-05 12:00", "2020-01-20 00:00"]).astype("datetime64[ns]"),
+        }
+    )
+
+    mapped = HospitalisationCleaner().map_data_to_hospitalisation(
+        hospitalisations[["patient_id", "hosp_start", "hosp_stop"]], samples, "sample_date"
+    )
+    assert mapped["episode_id"].iloc[0] == 1
+    assert mapped["episode_id"].iloc[1:].isna().all()
+
+    readmitted = OutcomesCleaner().add_readmitted(
+        samples, hospitalisations.rename(columns={"hosp_start": "in_date"}), "sample_date"
+    )
+    assert readmitted["readmitted"].tolist() == [True, True]
+    assert readmitted["time_to_readmittance"].tolist() == [26, 12]
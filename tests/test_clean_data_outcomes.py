@@ -0,0 +1,25 @@
+import pandas as pd
+
+from data_cleaning.cleaners.episode.clean_data_outcomes import OutcomesCleaner
+
+
+def test_add_readmitted_with_mixed_units_and_id_dtypes():
+    df = pd.DataFrame(
+        {
+            "episode_id": [1, 2, 3],
+            "patient_id": [10, 20, 30],
+            "sample_date": pd.to_datetime(["2020-01-01", "2020-02-01", "2020-03-01"]).astype("datetime64[ns]"),
+        }
+    )
+    hospitalisations_df = pd.DataFrame(
+        {
+            "patient_id": [10.0, 10.0, 20.0],
+            "in_date": pd.to_datetime(["2020-01-11", "2020-01-05", "2020-01-15"]).astype("datetime64[s]"),
+        }
+    )
+
+    result = OutcomesCleaner().add_readmitted(df, hospitalisations_df, "sample_date")
+
+    assert result["readmitted"].tolist() == [True, False, False]
+    assert result["time_to_readmittance"].iloc[0] == 4
+    assert result["time_to_readmittance"].iloc[1:].isna().all()
@@ -0,0 +1,37 @@
+import json
+
+import pandas as pd
+
+from data_cleaning.renaming import rename_values
+
+
+def _write_rename_values(tmp_path):
+    path = tmp_path / "rename_values.json"
+    path.write_text(
+        json.dumps({"bottle_nr": {"Flaska 1": "bottle 1", "Flaska 2": "bottle 2", "TTD FLASKA 1": "bottle 1", "Okänd": ""}}),
+        encoding="utf-8",
+    )
+    return str(path)
+
+
+def test_rename_values_categorical_column(tmp_path):
+    path = _write_rename_values(tmp_path)
+    df = pd.DataFrame({"bottle_nr": pd.Categorical(["Flaska 1", "Flaska 2", None, "Okänd", "TTD FLASKA 1"])})
+
+    renamed = rename_values(df, path)["bottle_nr"]
+
+    assert isinstance(renamed.dtype, pd.CategoricalDtype)
+    assert renamed.tolist()[:2] == ["bottle 1", "bottle 2"]
+    assert pd.isna(renamed.iloc[2])
+    assert renamed.tolist()[3:] == ["Okänd", "bottle 1"]
+
+
+def test_rename_values_arrow_string_column(tmp_path):
+    path = _write_rename_values(tmp_path)
+    df = pd.DataFrame({"bottle_nr": pd.Series(["Flaska 1", "Flaska 2", None, "Okänd"], dtype="string[pyarrow]")})
+
+    renamed = rename_values(df, path)["bottle_nr"]
+
+    assert renamed.tolist()[:2] == ["bottle 1", "bottle 2"]
+    assert pd.isna(renamed.iloc[2])
+    assert renamed.iloc[3] == "Okänd"